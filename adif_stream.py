@@ -0,0 +1,115 @@
+"""
+An incremental reader for ADIF (.adi) files, yielding one QSO at a time as the file is read, so
+that a multi-year log doesn't have to be held in memory before the first label can be made.
+
+Records come out the way adif_io.read_from_string() gives them: dicts with upper-cased field
+names, and with empty fields left out. The header, if any, is skipped.
+
+"""
+
+
+import io
+import re
+import sys
+
+# How much of the file to read at a time, in characters.
+CHUNK_SIZE = 64 * 1024
+
+# <NAME:LENGTH> or <NAME:LENGTH:TYPE>, or a bare <EOH> or <EOR>.
+TAG_RE = re.compile(r"<(\w+)(?::(\d+)(?::[^>]*)?)?>")
+
+
+def read_records(file_object, chunk_size=CHUNK_SIZE):
+    """read_records(file_object, chunk_size=CHUNK_SIZE):
+
+    Given a file-like object (on which it can call read()), read it chunk_size characters at a
+    time and pick out ADIF records as they're completed. Fields seen before an <EOH> belong to
+    the header and are dropped.
+
+    Returns: a generator of dicts, one per QSO.
+
+    """
+    buffer = ''
+    pos = 0
+    record = {}
+    eof = False
+    while True:
+        match = TAG_RE.search(buffer, pos)
+        # A tag, or its value, that runs on into the next chunk needs more of the file.
+        if match is None or (match.group(2) is not None and
+            match.end() + int(match.group(2)) > len(buffer)):
+            if eof:
+                break
+            keep = buffer.rfind('<', pos) if match is None else match.start()
+            buffer = buffer[keep:] if keep >= 0 else ''
+            pos = 0
+            chunk = file_object.read(chunk_size)
+            if chunk:
+                buffer += chunk
+            else:
+                eof = True
+            continue
+
+        name = match.group(1).upper()
+        if match.group(2) is None:
+            pos = match.end()
+            if name == 'EOR':
+                if record:
+                    yield record
+                record = {}
+            elif name == 'EOH':
+                record = {}
+            continue
+
+        value_end = match.end() + int(match.group(2))
+        value = buffer[match.end():value_end]
+        if value:
+            record[name] = value
+        pos = value_end
+
+
+# ADIF text, and the records adif_io.read_from_string() gave for it, for run_tests().
+SAMPLES = [
+    ("Log exported <ADIF_VER:5>3.1.0 <PROGRAMID:6>WSJT-X <eoh>\n"
+        "<call:5>W7WIL <qso_date:8>20221009 <time_on:6>180400 <NOTES:24>POTA <Activation>\n"
+        "K-1234 <comment:0> <eor>\n"
+        "<CALL:4>K1AB<QSO_DATE:8:D>20221010<TIME_ON:4>1200<FREQ:6>14.074<EOR>\n",
+        [{'CALL': 'W7WIL', 'QSO_DATE': '20221009', 'TIME_ON': '180400',
+            'NOTES': 'POTA <Activation>\nK-1234'},
+        {'CALL': 'K1AB', 'QSO_DATE': '20221010', 'TIME_ON': '1200', 'FREQ': '14.074'}]),
+    ("<CALL:4>K1AB<QSO_DATE:8>20221010<EOR><CALL:4>K2CD<EOR>",
+        [{'CALL': 'K1AB', 'QSO_DATE': '20221010'}, {'CALL': 'K2CD'}]),
+    ("<EOH><CALL:4>K1AB<EOR><CALL:4>K2CD", [{'CALL': 'K1AB'}]),
+    ("header<EOH>\n<CALL:5>W7WIL<NAME:4>José<EOR>\n\n", [{'CALL': 'W7WIL', 'NAME': 'José'}]),
+    ("<EOH><CALL:4>K1AB<NOTES:9>a<b:1>cde<EOR>", [{'CALL': 'K1AB', 'NOTES': 'a<b:1>cde'}]),
+]
+
+
+def run_tests(path=None):
+    """run_tests(path=None):
+
+    Check that read_records() gives the records adif_io.read_from_string() did for each of the
+    SAMPLES, however the file happens to be split into chunks. If path is given, the log there
+    is checked against adif_io itself, which has to be installed for that. (adif_io also gives
+    back an empty record for two <EOR>s in a row; read_records() leaves it out.)
+
+    Returns: nothing; raises AssertionError if a check fails.
+
+    """
+    for text, expected in SAMPLES:
+        for chunk_size in range(1, len(text) + 2):
+            records = list(read_records(io.StringIO(text), chunk_size))
+            assert records == expected, (text, chunk_size, records)
+    if path is not None:
+        import adif_io
+        with open(path, encoding='utf-8') as log:
+            expected = [dict(qso) for qso in adif_io.read_from_string(log.read())[0]]
+        for chunk_size in (1, 7, 4096, CHUNK_SIZE):
+            with open(path, encoding='utf-8') as log:
+                assert list(read_records(log, chunk_size)) == expected, (path, chunk_size)
+        print(f"{len(expected)} records in {path} match adif_io")
+    print("adif_stream: all tests passed")
+
+
+if __name__ == "__main__":
+    run_tests(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -6,48 +6,97 @@ This program takes an ADIF file and turns it into QSL card labels or images ther
 
 
 import argparse
+import atexit
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
 import csv
+import itertools
+import multiprocessing
 from datetime import datetime
-import json
+import io
+from operator import itemgetter
 import os
-import subprocess
-import secrets
+import re
 import sqlite3
 import sys
+import tempfile
+import time
 
-import adif_io # https://gitlab.com/andreas_krueger_py/adif_io
 from wand.image import Image # https://docs.wand-py.org/
 from wand.drawing import Drawing
 from wand.color import Color
 
-# https://brother-ql.net/ - this program calls the command-line utilities,
-#   but doesn't use them pythonically
-
+import adif_stream
+import callsign_cache
+import card_sheets
+import callsign_index
 import imb
+import mailing_journal
+import mailing_manifest
+import pipeline
+import ql_printer # https://brother-ql.net/, used as a library
 import qsl_config
+import qsl_ledger
+import serial_allocator
+import timings
 
 MAKE_IMAGES = False
 
 QSL_CARD_PATH = 'qsl_cards/'
 
+# 4.75" wide, 2.4" tall, and brother_ql expects 290 dpi for this.
+CARD_DPI = 290
+CARD_WIDTH = int(CARD_DPI * 4.75)
+CARD_HEIGHT = int(CARD_DPI * 2.4)
+FONT_DIR = os.path.dirname(os.path.abspath(__file__))
+FONT_REGULAR = os.path.join(FONT_DIR, 'Inconsolata-Regular.ttf')
+FONT_BOLD = os.path.join(FONT_DIR, 'Inconsolata-Bold.ttf')
+FONT_IMB = os.path.join(FONT_DIR, 'USPSIMBStandard.ttf')
+# Most QSOs in the table on one grouped card; any more go on another card.
+GROUP_ROWS = 8
+# Largest font size for that table, and the width it has to fit in. Inconsolata's characters are
+# half as wide as the font size.
+TABLE_FONT_SIZE = 36
+TABLE_WIDTH = int(CARD_DPI * 1.85)
 
-def parse_adif(file_object):
-    """parse_adif(file_object):
+# Peak memory budget for --parse_db, in MB. Roughly half goes to SQLite's page cache and half to
+# the batches of rows handed to executemany().
+DEFAULT_MAX_MEMORY_MB = 64
+# Rough size of one parsed EN.dat row in memory, used to turn the budget into a batch size.
+ROW_BYTES_ESTIMATE = 512
+# Bumped whenever the layout of uls.db changes; see upgrade_db().
+SCHEMA_VERSION = 2
+AMATEURS_TABLE_SQL = ("CREATE TABLE IF NOT EXISTS {table}" +
+    "(identifier text PRIMARY KEY, callsign text, firstname text, lastname text, " +
+    "address text, city text, state text, zipcode text, active integer DEFAULT 0)")
+# Every QSO is looked up by callsign and active status.
+CALLSIGN_INDEX_SQL = ("CREATE INDEX IF NOT EXISTS amateurs_callsign_active " +
+    "ON amateurs (callsign, active)")
+UPDATES_TABLE_SQL = ("CREATE TABLE IF NOT EXISTS uls_updates" +
+    "(kind text, dump_date text, applied_at text)")
+# How many QSOs lookup_addresses() resolves against uls.db at a time.
+LOOKUP_CHUNK = 500
+# How often (in rows) parse_db() reports its progress.
+PROGRESS_EVERY = 100000
+# What read_qsos() needs of a QSO's fields to make a card of it: a Maidenhead grid square
+# (field, square, and optionally subsquare and extended square), a YYYYMMDD date, and an HHMM
+# or HHMMSS time.
+GRID_SQUARE_RE = re.compile(r'[A-R]{2}[0-9]{2}([A-X]{2}([0-9]{2})?)?', re.IGNORECASE)
+QSO_DATE_RE = re.compile(r'[0-9]{8}')
+TIME_ON_RE = re.compile(r'[0-9]{4}([0-9]{2})?')
 
-    Given a file-like object (on which it can call read()), generate an array full of QSOs.
 
-    Returns: an array of dicts, where each dict is a single QSO, augmented with FCC data
-    if available.
+def read_qsos(file_object):
+    """read_qsos(file_object):
 
-    """
-    # [0] because the read_from_string() returns a tuple of qsos_raw, adif_header
-    # (We don't need the headers for this, so just dropping them on the floor)
-    qsos_raw = adif_io.read_from_string(file_object.read())[0]
-    con = sqlite3.connect('uls.db')
-    # Allows use of dictionary lookups on returns, see https://stackoverflow.com/a/3300514
-    con.row_factory = sqlite3.Row
-    cur = con.cursor()
+    Given a file-like object (on which it can call read()), read QSOs from it one at a time and
+    pull out what goes on a card. A QSO that can't be made into a card (see qso_problem()) is
+    reported and skipped, so that one bad record doesn't stop a run that's already printing.
 
+    Returns: a generator of dicts, where each dict is a single QSO, without FCC data yet.
+
+    """
     # What we need for a QSL Card:
     ## Date
     ## Time (UTC)
@@ -61,16 +110,12 @@ def parse_adif(file_object):
     # Optionally add:
     ## My POTA Location
 
-    # From their callsign, look up:
-    ## Their name [8] [10]
-    ## Their Address [15]
-    ## Their City [16]
-    ## Their State [17]
-    ## Their Zip [18]
-
-    qsos_parsed = []
-
-    for qso in qsos_raw:
+    for qso in adif_stream.read_records(file_object):
+        problem = qso_problem(qso)
+        if problem:
+            print(f"=====\nSkipping the QSO with {qso.get('CALL')} on {qso.get('QSO_DATE')}: " +
+                f"{problem}\n=====")
+            continue
         q_p = {}
         q_p['callsign'] = qso.get('CALL')
         q_p['date'] = qso.get('QSO_DATE')
@@ -80,11 +125,9 @@ def parse_adif(file_object):
         q_p['time'] = f"{q_p['time'][0:2]}:{q_p['time'][2:4]}:{q_p['time'][4:6]}Z"
 
         q_p['qth'] = qso.get('MY_GRIDSQUARE')
-        if q_p['qth'] is None:
-            print(f"The QSO with {q_p['callsign']} does not contain a MY_GRIDSQUARE, quitting.")
-            sys.exit(1)
 
         q_p['frequency'] = qso.get('FREQ')
+        q_p['band'] = qso.get('BAND')
         q_p['power'] = qso.get('TX_PWR')
         if q_p['power'] and q_p['power'][-1].upper() != "W":
             q_p['power'] = f"{q_p['power']}W"
@@ -99,188 +142,1189 @@ def parse_adif(file_object):
         if q_p['notes']:
             q_p['notes'] = f"POTA Activation\nfrom {q_p['notes']}"
 
-        res = cur.execute(f'SELECT * from amateurs where callsign = \"{q_p["callsign"]}\" ' +
-            'and active = 1;').fetchall()
+        yield q_p
+
+def qso_problem(qso):
+    """qso_problem(qso):
+
+    Check that a record from adif_stream.read_records() has what a card needs: a callsign, a
+    date and time on, and a grid square of our own.
+
+    Returns: what's wrong with it, as a string, or None if nothing is.
+
+    """
+    if not qso.get('CALL'):
+        return "it has no CALL"
+    if not QSO_DATE_RE.fullmatch(qso.get('QSO_DATE', '')):
+        return f"its QSO_DATE, {qso.get('QSO_DATE')}, isn't YYYYMMDD"
+    if not TIME_ON_RE.fullmatch(qso.get('TIME_ON', '')):
+        return f"its TIME_ON, {qso.get('TIME_ON')}, isn't HHMM or HHMMSS"
+    if 'MY_GRIDSQUARE' not in qso:
+        return "it has no MY_GRIDSQUARE"
+    if not GRID_SQUARE_RE.fullmatch(qso['MY_GRIDSQUARE']):
+        return f"its MY_GRIDSQUARE, {qso['MY_GRIDSQUARE']}, isn't a grid square"
+    return None
+
+def _chunks(iterable, size):
+    """_chunks(iterable, size):
+
+    Split an iterable into lists of up to size items, without reading ahead any further.
+
+    Returns: a generator of lists.
+
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def lookup_addresses(qsos, cache=None, index=None):
+    """lookup_addresses(qsos, cache=None, index=None):
+
+    Add FCC name and address data to a stream of QSOs. QSOs are taken LOOKUP_CHUNK at a time,
+    and the callsigns in each chunk that haven't been seen yet this run are resolved together
+    with lookup_callsigns(), or with lookup_callsigns_index() if index is a
+    callsign_index.CallsignIndex. If cache is a callsign_cache.CallsignCache, addresses are
+    taken from it where possible, and the ones looked up are added to it.
+
+    Returns: a generator of QSO dicts, in the order they came in.
+
+    """
+    # From their callsign, look up:
+    ## Their name [8] [10]
+    ## Their Address [15]
+    ## Their City [16]
+    ## Their State [17]
+    ## Their Zip [18]
+
+    if index is None:
+        con = sqlite3.connect('uls.db')
+        # Allows use of dictionary lookups on returns, see https://stackoverflow.com/a/3300514
+        con.row_factory = sqlite3.Row
+        upgrade_db(con)
+        generation = uls_generation(con)
+        lookup = lambda callsigns: lookup_callsigns(con, callsigns)
+    else:
+        con = None
+        check_index(index)
+        generation = index.generation
+        lookup = lambda callsigns: lookup_callsigns_index(index, callsigns)
+    if cache is not None:
+        cache.check_generation(generation)
+
+    addresses = {}
+    try:
+        for chunk in _chunks(qsos, LOOKUP_CHUNK):
+            callsigns = {q_p['callsign'] for q_p in chunk} - addresses.keys()
+            if cache is None:
+                addresses.update(lookup(callsigns))
+            else:
+                with timings.timed('cache'):
+                    cached = cache.get_many(callsigns)
+                timings.count('cache_hits', len(cached))
+                timings.count('cache_misses', len(callsigns) - len(cached))
+                looked_up = lookup(callsigns - cached.keys())
+                with timings.timed('cache'):
+                    cache.put_many(looked_up)
+                addresses.update(cached)
+                addresses.update(looked_up)
+
+            for q_p in chunk:
+                address = addresses.get(q_p['callsign'])
+                if address is None:
+                    q_p['has_address'] = False
+                else:
+                    q_p['has_address'] = True
+                    q_p.update(address)
+                yield q_p
+    finally:
+        if con is not None:
+            con.close()
+
+def add_barcodes(qsos, allocator):
+    """add_barcodes(qsos, allocator):
+
+    Give every QSO that has an address a serial number, from allocator (a
+    serial_allocator.SerialAllocator), and an Intelligent Mail barcode. Serials are reserved a
+    chunk at a time, and recorded against the QSO they went to. Barcodes
+    are encoded LOOKUP_CHUNK QSOs at a time with imb.encode_many(), then decoded again with
+    imb.verify_many() and checked against the ZIP and serial they came from before any of them
+    go on to be printed. A barcode that doesn't check out stops the run; since the log streams
+    through a chunk at a time, labels from earlier chunks (whose barcodes did check out) may
+    have printed by then. QSOs that already have a barcode (from a resumed mailing's journal)
+    keep it.
+
+    Returns: a generator of QSO dicts, in the order they came in.
+
+    """
+    ids = (int(qsl_config.BARCODE_ID), int(qsl_config.SERVICE_ID), int(qsl_config.MY_MAILER_ID))
+    verified = 0
+    verify_time = 0.0
+    for chunk in _chunks(qsos, LOOKUP_CHUNK):
+        mailable = [q_p for q_p in chunk if q_p['has_address'] and 'imbcode' not in q_p]
+        with timings.timed('serials'):
+            serials = allocator.reserve(len(mailable))
+        for q_p, serial in zip(mailable, serials):
+            q_p['serial'] = allocator.format(serial)
+        zipcodes = [q_p['zip'].replace('-', '') for q_p in mailable]
+        with timings.timed('imb_encode'):
+            imbcodes = imb.encode_many(*ids, serials, zipcodes)
+
+        started = time.perf_counter()
+        with timings.timed('imb_verify'):
+            problems = imb.verify_many(*ids, serials, zipcodes, imbcodes)
+        verify_time += time.perf_counter() - started
+        if problems:
+            print("==========ERROR==========")
+            for index, problem in problems:
+                print(f"The barcode for {mailable[index]['callsign']} doesn't check out: {problem}")
+            print("Stopping before any of these are printed. Labels already printed had good " +
+                "barcodes; once this is fixed, run again with --resume to carry on.")
+            sys.exit(1)
+        verified += len(mailable)
+
+        for q_p, imbcode in zip(mailable, imbcodes):
+            q_p['imbcode'] = imbcode
+        with timings.timed('serials'):
+            allocator.record([(serial, q_p['callsign'], q_p['date'], q_p['time'])
+                for q_p, serial in zip(mailable, serials)])
+        timings.count('barcodes', len(mailable))
+        yield from chunk
+    print(f"Verified {verified} barcodes in {verify_time * 1000:.1f}ms")
+
+def group_qsos(qsos, by_address=False):
+    """group_qsos(qsos, by_address=False):
+
+    Gather up every QSO with the same station, in one pass over qsos, so that each station gets
+    one card listing all of its QSOs. Stations are told apart by callsign, or, if by_address
+    is set, by mailing address (so a household or club with several callsigns gets one card);
+    QSOs without an address are still grouped by callsign. QSOs from different grid squares or
+    activations go on separate cards, since a card confirms contacts from one place.
+
+    A station with a single QSO gets the QSO itself back, as an ordinary card. Otherwise the
+    card is a copy of its first QSO, with every QSO in a 'qsos' list, and 'callsigns' listing
+    the station's callsigns. A group too long for one card is split into several, numbered
+    with 'part' and 'parts'. Since every QSO has to be seen before any group is complete, this
+    holds the whole log in memory.
+
+    Returns: a generator of cards, in order of each station's first QSO.
+
+    """
+    groups = {}
+    count = 0
+    for q_p in qsos:
+        count += 1
+        station = q_p['callsign']
+        if by_address and q_p['has_address']:
+            station = (q_p['address'], q_p['city'], q_p['state'], q_p['zip'])
+        groups.setdefault((station, q_p['qth'], q_p['notes']), []).append(q_p)
+    print(f"Grouped {count} QSOs into {len(groups)} stations")
+
+    for group in groups.values():
+        if len(group) == 1:
+            yield group[0]
+            continue
+        callsigns = list(dict.fromkeys(q_p['callsign'] for q_p in group))
+        parts = [group[start:start + GROUP_ROWS] for start in range(0, len(group), GROUP_ROWS)]
+        for number, part in enumerate(parts, 1):
+            card = dict(part[0])
+            card['callsigns'] = callsigns
+            card['qsos'] = part
+            if len(parts) > 1:
+                card['part'] = number
+                card['parts'] = len(parts)
+            yield card
+
+def parse_adif(file_object, cache=None, allocator=None, index=None, group=None, journal=None,
+    ledger=None, stages=None):
+    """parse_adif(file_object, cache=None, allocator=None, index=None, group=None, journal=None,
+    ledger=None, stages=None):
+
+    Given a file-like object (on which it can call read()), generate QSOs from it as it's read:
+    read_qsos(), then lookup_addresses(), then add_barcodes(). Nothing is read until the first
+    QSO is asked for, and the file is never held in memory all at once. Serials come from
+    allocator, or from the default serials.db for MY_MAILER_ID if it isn't given. Addresses
+    come from uls.db, or from index (a callsign_index.CallsignIndex) if it's given.
+
+    If ledger (a qsl_ledger.SentLedger) is given, QSOs that cards have already been sent for are
+    dropped straight after they're read, before any lookups.
+
+    If group is 'callsign' or 'address', QSOs are gathered into one card per station with
+    group_qsos() before they get barcodes, so each card gets just one serial.
+
+    If journal (a mailing_journal.MailingJournal) is given, every QSO is journaled as parsed once
+    it has its barcode, and when resuming, the ones already printed are left out.
+
+    If stages (a pipeline.Pipeline) is given, reading, looking up and barcoding each run in a
+    thread of their own, as the 'read', 'lookup' and 'barcode' stages, and start straight away.
+
+    Returns: a generator of dicts, where each dict is a single QSO (or a card of several),
+    augmented with FCC data if available.
+
+    """
+    if allocator is None:
+        allocator = serial_allocator.SerialAllocator(qsl_config.MY_MAILER_ID)
+    stage = (lambda name, items: items) if stages is None else stages.stage
+    qsos = timings.timed_items('read', read_qsos(file_object))
+    if ledger is not None:
+        qsos = timings.timed_items('ledger', ledger.unsent(qsos))
+    qsos = stage('read', qsos)
+    qsos = timings.timed_items('lookup', lookup_addresses(qsos, cache, index))
+    if group:
+        qsos = timings.timed_items('group', group_qsos(qsos, by_address=(group == 'address')))
+    qsos = stage('lookup', qsos)
+    if journal is None:
+        return stage('barcode', timings.timed_items('barcode', add_barcodes(qsos, allocator)))
+    # add_barcodes() works a chunk at a time, so journal each chunk as soon as it's done, before
+    # any of it is printed.
+    qsos = timings.timed_items('barcode',
+        add_barcodes(timings.timed_items('journal', journal.restore(qsos)), allocator))
+    return stage('barcode',
+        (q_p for chunk in _chunks(qsos, LOOKUP_CHUNK) for q_p in journal.track(chunk)))
+
+def format_address(row):
+    """format_address(row):
+
+    Given a row from the amateurs table, tidy up the name and address for printing.
+
+    Returns: a dict with firstname, lastname, address, city, state and zip.
+
+    """
+    address = {}
+    address['firstname'] = row['firstname'].title()
+    address['lastname'] = row['lastname'].title()
+    address['address'] = row['address'].title()
+    address['city'] = row['city'].title()
+    address['state'] = row['state']
+    if len(row['zipcode']) > 5:
+        address['zip'] = f"{row['zipcode'][0:5]}-{row['zipcode'][5:9]}"
+    else:
+        address['zip'] = f"{row['zipcode'][0:5]}"
+    return address
+
+def lookup_callsigns(con, callsigns):
+    """lookup_callsigns(con, callsigns):
+
+    Resolve a set of callsigns against uls.db in one query, by loading them into a temp table
+    and joining it against the active amateurs. Each callsign is checked (and complained
+    about, if it can't be found) once, no matter how many QSOs it appears in.
+
+    Returns: a dict of callsign to the dict from format_address(), or to None if there is no
+    active FCC record for that callsign.
+
+    """
+    cur = con.cursor()
+    found = {}
+    with timings.timed('sqlite'):
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (callsign text PRIMARY KEY)")
+        cur.execute("DELETE FROM wanted")
+        cur.executemany("INSERT OR IGNORE INTO wanted (callsign) VALUES (?)",
+            [(callsign,) for callsign in callsigns if callsign])
+
+        # CROSS JOIN makes SQLite probe amateurs once per wanted callsign, rather than scan it.
+        for row in cur.execute("SELECT amateurs.* FROM wanted CROSS JOIN amateurs " +
+            "ON amateurs.callsign = wanted.callsign AND amateurs.active = 1"):
+            found.setdefault(row['callsign'], []).append(format_address(row))
+    timings.count('sql_queries')
+    timings.count('callsigns_looked_up', len(callsigns))
+    return _resolve_addresses(callsigns, found)
+
+def lookup_callsigns_index(index, callsigns):
+    """lookup_callsigns_index(index, callsigns):
+
+    lookup_callsigns(), but against a callsign_index.CallsignIndex instead of uls.db. The
+    index holds addresses already run through format_address() when it was exported.
+
+    Returns: a dict of callsign to the dict from format_address(), or to None if there is no
+    active FCC record for that callsign.
+
+    """
+    with timings.timed('index'):
+        found = {callsign: index.find(callsign) for callsign in callsigns if callsign}
+    timings.count('callsigns_looked_up', len(callsigns))
+    return _resolve_addresses(callsigns, found)
+
+def _resolve_addresses(callsigns, found):
+    """_resolve_addresses(callsigns, found):
+
+    Check the addresses (from format_address()) found for each of a set of callsigns: there
+    should be exactly one, with a ZIP code that can go in an Intelligent Mail barcode. One that
+    can't is reported, and the callsign treated as if it had no address.
+
+    Returns: a dict of callsign to its address, or to None if there is no record for that
+    callsign.
+
+    """
+    addresses = {}
+    for callsign in sorted(callsign for callsign in callsigns if callsign):
+        res = found.get(callsign, [])
         if len(res) > 1:
             print("==========ERROR==========")
-            print(f"While finding FCC records for {q_p['callsign']}, I found more than one " +
+            print(f"While finding FCC records for {callsign}, I found more than one " +
             "simultaneous active record. Since this really should never, ever happen, I am " +
             "terminating and letting you figure it out.")
             sys.exit(1)
         elif len(res) == 0:
-            print(f"=====\nCan't find a name/address for {q_p['callsign']}. " +
+            print(f"=====\nCan't find a name/address for {callsign}. " +
                 "Printing label without that!\n=====")
-            q_p['has_address'] = False
+            addresses[callsign] = None
         else:
-            row = res[0]
-            q_p['has_address'] = True
-            q_p['firstname'] = row['firstname'].title()
-            q_p['lastname'] = row['lastname'].title()
-            q_p['address'] = row['address'].title()
-            q_p['city'] = row['city'].title()
-            q_p['state'] = row['state']
-            if len(row['zipcode']) > 5:
-                q_p['zip'] = f"{row['zipcode'][0:5]}-{row['zipcode'][5:9]}"
+            try:
+                imb.convert_routing_code(res[0]['zip'].replace('-', ''))
+            except ValueError:
+                print(f"=====\nThe ZIP code for {callsign}, {res[0]['zip']}, can't go in a " +
+                    "barcode. Printing label without a name/address!\n=====")
+                addresses[callsign] = None
+                continue
+            addresses[callsign] = res[0]
+    return addresses
+
+class CardRenderer:
+    """CardRenderer():
+
+    Draws QSO cards. The blank label is built once and cloned for every card, the font files
+    are located once, and each card's text goes down in a single Drawing, so the only per-card
+    work is the text and barcode that actually change.
+
+    """
+
+    def __init__(self):
+        for path in (FONT_REGULAR, FONT_BOLD, FONT_IMB):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(path)
+        self.template = Image(width=CARD_WIDTH, height=CARD_HEIGHT, background=Color('white'))
+        # Nothing on a card is in color, so don't pay for color channels.
+        self.template.type = 'grayscale'
+
+    def render(self, qso, rotate=False, image_format='png', mono=False):
+        """render(qso, rotate=False, image_format='png', mono=False):
+
+        Draw a single QSO card. If mono is set, text is drawn without anti-aliasing and the
+        card is kept to pure black and white, which is all the label printer can print anyway.
+
+        Returns: the card as bytes in image_format, rotated 90 degrees for the label printer if
+        rotate is set. 'gray' gives raw 8-bit grayscale pixels, 'pbm' a 1-bit PBM, and 'fastpng'
+        a PNG that's quick to write, at the cost of being larger.
+
+        """
+        res = CARD_DPI
+        with self.template.clone() as img:
+            with Drawing() as draw:
+                draw.text_antialias = not mono
+                # Build the QSL bits, then the address and IMb
+                # 2.5" wide left half, 2.25" wide right half ("half")
+                if 'qsos' in qso: # Several QSOs, in a table
+                    header_text, table_text, table_size = qso_table(qso)
+                    self._text(draw, FONT_REGULAR, 40, res * 0.1, res * 0.15, header_text)
+                    table_y = res * 0.15 + (header_text.count('\n') + 1.5) * 40 * 1.2
+                    self._text(draw, FONT_REGULAR, table_size, res * 0.1, table_y, table_text)
+                else:
+                    qso_text = (f"{qso['date']}\n{qso['time']}\n\n{qso['qth']}\n" +
+                        f"{qso['frequency']}\n{qso['power']}\n{qso['mode']}\n{qso['signal']}")
+                    if qso['notes']:
+                        qso_text += f"\n\n{qso['notes']}"
+                    self._text(draw, FONT_REGULAR, 60, res * 0.1, res * 0.15, qso_text)
+
+                # Every callsign is in the table; don't run the name line off the label.
+                callsigns = qso.get('callsigns', [qso['callsign']])
+                callsign = '/'.join(callsigns) if len(callsigns) <= 2 else f"{callsigns[0]} et al."
+                if qso['has_address']: # They're in the FCC DB
+                    name_text = f"{qso['firstname']} {qso['lastname']}, {callsign}"
+                    self._text(draw, FONT_BOLD, 55, res * 2.0, res * 1.0, name_text)
+                    address_text = (f"{qso['address']}\n{qso['city']}, {qso['state']} " +
+                        f"{qso['zip']}")
+                    self._text(draw, FONT_REGULAR, 50, res * 2.0, res * 1.2, address_text)
+                    self._text(draw, FONT_IMB, 54, res * 2.0, res * 1.5, qso['imbcode'])
+                else: # Just draw a callsign and the rest of the label, nothing else
+                    self._text(draw, FONT_BOLD, 55, res * 2.0, res * 1.0, callsign)
+                draw(img)
+
+            if rotate:
+                img.rotate(90)
+            if mono:
+                img.type = 'bilevel'
             else:
-                q_p['zip'] = f"{row['zipcode'][0:5]}"
+                img.depth = 8
+            if image_format == 'fastpng':
+                # zlib level 1 and no filtering: PNG's compression is most of the cost of saving.
+                img.compression_quality = 10
+                image_format = 'png'
+            return img.make_blob(image_format)
+
+    @staticmethod
+    def _text(draw, font, size, x, y, text):
+        """Queue up text at (x, y) on draw, in the given font file and point size."""
+        draw.font = font
+        draw.font_size = size
+        draw.text(int(x), int(y), text)
+
+def qso_table(card):
+    """qso_table(card):
+
+    Lay out the QSOs on a grouped card (see group_qsos()) as a table, one row per QSO, in
+    columns just wide enough for what's in them. What's the same for every QSO (where they
+    were made from, the power when it doesn't vary, and any activation notes) goes in a header
+    above it instead.
+
+    Returns: a tuple of (header text, table text, font size for the table, so that it fits in
+    TABLE_WIDTH).
+
+    """
+    qsos = card['qsos']
+    header = [card['qth']]
+    columns = [('Date', 'date'), ('UTC', 'time')]
+    if len({q_p['callsign'] for q_p in qsos}) > 1:
+        columns.insert(0, ('Call', 'callsign'))
+    columns += [('MHz', 'frequency'), ('Mode', 'mode'), ('RST', 'signal')]
+    if len({q_p['power'] for q_p in qsos}) > 1:
+        columns.insert(-1, ('Pwr', 'power'))
+    elif qsos[0]['power']:
+        header[0] += f"  {qsos[0]['power']}"
+    if card['notes']:
+        header.append(card['notes'])
+    if card.get('parts'):
+        header.append(f"Card {card['part']} of {card['parts']}")
+
+    rows = [[title for title, _ in columns]]
+    for q_p in qsos:
+        # The seconds and the Z are the same on every row; the UTC heading says it.
+        rows.append([(q_p[key] or '')[:5] if key == 'time' else (q_p[key] or '')
+            for _, key in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = [' '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows]
+    size = min(TABLE_FONT_SIZE, int(TABLE_WIDTH / (max(map(len, lines)) * 0.5)))
+    return '\n'.join(header), '\n'.join(lines), size
+
+# One per process, so each worker in a --jobs pool builds its template once.
+_RENDERER = None
+
+def render_card(qso, rotate=False, image_format='png', mono=False):
+    """render_card(qso, rotate=False, image_format='png', mono=False):
+
+    Draw a single QSO card with this process's CardRenderer. This runs in a worker process when
+    print_qsos() is given more than one job, so it only takes and returns things that can be
+    pickled.
+
+    Returns: the card as bytes in image_format, rotated 90 degrees for the label printer if
+    rotate is set.
+
+    """
+    global _RENDERER
+    if _RENDERER is None:
+        _RENDERER = CardRenderer()
+    return _RENDERER.render(qso, rotate, image_format, mono)
+
+def render_cards(qsos_parsed, jobs=1, image_format='png', mono=False, rotate=False):
+    """render_cards(qsos_parsed, jobs=1, image_format='png', mono=False, rotate=False):
+
+    Render QSO cards with render_card(), spread over a pool of jobs worker processes. Only a
+    couple of cards per worker are in flight at once, and cards come back in the same order
+    the QSOs went in. Cards are in image_format, and rotated 90 degrees (onto the label
+    printer's roll) if rotate is set.
+
+    The workers are started by a forkserver (or spawned, where there's no forkserver), never
+    forked from this process: with --pipeline, this runs in a thread of its own while the other
+    stages' threads may be holding locks, and a forked child would inherit them held.
 
-            q_p['serial'] = (f"{secrets.randbelow(10)}{secrets.randbelow(10)}" +
-                f"{secrets.randbelow(10)}{secrets.randbelow(10)}{secrets.randbelow(10)}" +
-                f"{secrets.randbelow(10)}")
-            q_p['imbcode'] = imb.encode(int(qsl_config.BARCODE_ID),
-                                        int(qsl_config.SERVICE_ID),
-                                        int(qsl_config.MY_MAILER_ID),
-                                        int(q_p['serial']),
-                                        row['zipcode'])
+    Returns: a generator of (qso, image bytes) tuples.
 
-        qsos_parsed.append(q_p)
-    return qsos_parsed
+    """
+    if jobs <= 1:
+        for qso in qsos_parsed:
+            yield qso, render_card(qso, rotate, image_format, mono)
+        return
+
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    with ProcessPoolExecutor(max_workers=jobs,
+        mp_context=multiprocessing.get_context(method)) as pool:
+        pending = deque()
+        for qso in qsos_parsed:
+            pending.append((qso, pool.submit(render_card, qso, rotate, image_format, mono)))
+            if len(pending) >= jobs * 2:
+                qso, future = pending.popleft()
+                yield qso, future.result()
+        while pending:
+            qso, future = pending.popleft()
+            yield qso, future.result()
+
+def print_qsos(qsos_parsed, jobs=1, print_to_file=None, batch=1, cut_every=1, journal=None,
+    ledger=None, stages=None, image_format='png', mono=False, sheets=None, manifest=None):
+    """print_qsos(qsos_parsed, jobs=1, print_to_file=None, batch=1, cut_every=1, journal=None,
+    ledger=None, stages=None, image_format='png', mono=False, sheets=None, manifest=None):
 
-def print_qsos(qsos_parsed):
-    """print_qsos(qsos_parsed):
+    Given an iterable of QSOs, generate images of QSO cards and/or print them to a label printer.
+    Rendering is spread across jobs processes; printing happens in order, over a single
+    connection to the printer, batch labels to a print job. The printer cuts after every
+    cut_every labels, or only at the end of each job if cut_every is 0. If print_to_file is
+    given, the printer's raster data is written to that file instead. Images are saved in
+    image_format ('png', 'fastpng' or 'pbm'). If mono is set, cards are drawn in black and white
+    only, and go to the printer as 1-bit rasters that need no further conversion. If sheets (a
+    card_sheets.SheetWriter) is given, images are laid out on its pages instead of saved one to
+    a file; they're for mailing, like printed cards, where images are only a preview.
 
-    Given an array full of QSOs, generate images of QSO cards and/or print them to a label printer.
+    If journal (a mailing_journal.MailingJournal) is given, each QSO is marked rendered as its
+    card is drawn, and printed once its print job has gone through (or its image is saved).
+    Likewise, printed cards (on labels or sheets) are added to ledger (a qsl_ledger.SentLedger),
+    if it's given; images aren't, since they won't be sent anywhere. Every label, printed or
+    saved, is written to manifest (a mailing_manifest.ManifestWriter), if it's given, as soon as
+    it's done.
+
+    If stages (a pipeline.Pipeline) is given, cards are rendered in a thread of their own (the
+    'render' stage), a few cards ahead of the printer, so that printing one card overlaps
+    rendering the next.
 
     Returns: nothing.
 
     """
-    for qso in qsos_parsed:
-        # 4.75" wide, 2.4" tall, and brother_ql expects 290 dpi for this.
-        res = 290
-        with Image(width=int(res*4.75), height=int(res*2.4), background = Color('white')) as img:
-            # Build the QSL bits, then the address and IMb
-            # 2.5" wide left half, 2.25" wide right half ("half")
-            qso_text = (f"{qso['date']}\n{qso['time']}\n\n{qso['qth']}\n{qso['frequency']}\n" +
-                f"{qso['power']}\n{qso['mode']}\n{qso['signal']}")
-            if qso['notes']:
-                qso_text += f"\n\n{qso['notes']}"
-            draw_qso = Drawing()
-            draw_qso.font = './Inconsolata-Regular.ttf'
-            draw_qso.font_size = 60
-            draw_qso.text(int(res * 0.1), int(res * 0.15), qso_text)
-            draw_qso(img)
-
-            if qso['has_address']: # They're in the FCC DB
-                name_text = f"{qso['firstname']} {qso['lastname']}, {qso['callsign']}"
-                draw_name = Drawing()
-                draw_name.font = './Inconsolata-Bold.ttf'
-                draw_name.font_size = 55
-                draw_name.text(int(res * 2.0), int(res * 1.0), name_text)
-                draw_name(img)
-
-                address_text = f"{qso['address']}\n{qso['city']}, {qso['state']} {qso['zip']}"
-                draw_address = Drawing()
-                draw_address.font = './Inconsolata-Regular.ttf'
-                draw_address.font_size = 50
-                draw_address.text(int(res * 2.0), int(res * 1.2), address_text)
-                draw_address(img)
-
-                draw_imb = Drawing()
-                draw_imb.font = './USPSIMBStandard.ttf'
-                draw_imb.font_size = 54
-                draw_imb.text(int(res * 2.0), int(res * 1.5), qso['imbcode'])
-                draw_imb(img)
-            else: # Just draw a callsign and the rest of the label, nothing else
-                name_text = f"{qso['callsign']}"
-                draw_name = Drawing()
-                draw_name.font = './Inconsolata-Bold.ttf'
-                draw_name.font_size = 55
-                draw_name.text(int(res * 2.0), int(res * 1.0), name_text)
-                draw_name(img)
-
-            if MAKE_IMAGES:
+    printer = None
+    rotate = False
+    if sheets is not None:
+        image_format = 'pbm' if mono else 'gray'
+    elif not MAKE_IMAGES:
+        printer = ql_printer.QLPrinter(qsl_config.PRINTER_IDENTIFIER, qsl_config.PRINTER_MODEL,
+            qsl_config.LABEL_SIZE, output_file=print_to_file)
+        # Rotated onto the roll, as raw grayscale, or as 1-bit PBMs if mono is set.
+        rotate, image_format = True, 'pbm' if mono else 'gray'
+    # The QSOs on the labels waiting in the printer's queue, or on the page in progress.
+    queued = []
+    cards = timings.timed_items('render',
+        render_cards(qsos_parsed, jobs, image_format, mono, rotate))
+    if stages is not None:
+        cards = stages.stage('render', cards, depth=max(2, jobs * 2))
+    try:
+        for qso, card in cards:
+            if journal is not None:
+                journal.mark([qso], 'rendered')
+            done = []
+            if sheets is not None:
+                with timings.timed('sheets'):
+                    if mono:
+                        size, raster = ql_printer.read_pbm(card)
+                        page_done = sheets.add_card(raster, size, bilevel=True)
+                    else:
+                        page_done = sheets.add_card(card, (CARD_WIDTH, CARD_HEIGHT))
+                queued.append(qso)
+                if page_done:
+                    done, queued = queued, []
+            elif MAKE_IMAGES:
                 if not os.path.isdir(QSL_CARD_PATH):
                     os.mkdir(QSL_CARD_PATH)
-                filepath = f"{QSL_CARD_PATH}{qso['callsign']}-{qso['date']}.png"
-                img.save(filename=filepath)
+                filepath = f"{QSL_CARD_PATH}{qso['callsign']}-{qso['date']}"
+                if qso.get('parts'):
+                    filepath += f"-{qso['part']}"
+                filepath += ".pbm" if image_format == 'pbm' else ".png"
+                with timings.timed('save_image'), open(filepath, 'wb') as png_file:
+                    png_file.write(card)
+                done = [qso]
             else:
-                img.rotate(90)
-                img.save(filename='temp.png')
-                subprocess.run(
-                    ["brother_ql_create --model QL-800 --label-size 62 ./temp.png > labelout.bin"],
-                    shell=True, check=False)
-                subprocess.run([f"brother_ql_print labelout.bin {qsl_config.PRINTER_IDENTIFIER}"],
-                    shell=True, check=False)
-                os.remove('temp.png')
-                os.remove('labelout.bin')
+                with timings.timed('convert'):
+                    if mono:
+                        size, raster = ql_printer.read_pbm(card)
+                        printer.queue_card(raster, size, bilevel=True)
+                    else:
+                        # Rotated onto the roll, so the label's height is the raster's width.
+                        printer.queue_card(card, (CARD_HEIGHT, CARD_WIDTH))
+                queued.append(qso)
+                if len(queued) >= batch:
+                    printer.flush(cut_every)
+                    done, queued = queued, []
+            _finished(done, journal, ledger, manifest)
+        if printer:
+            printer.flush(cut_every)
+        if sheets is not None:
+            sheets.flush()
+        _finished(queued, journal, ledger, manifest)
+    finally:
+        if printer:
+            printer.close()
 
-def dump_qsos(qsos_parsed):
-    """dump_qsos(qsos_parsed):
+def _finished(qsos, journal, ledger, manifest):
+    """_finished(qsos, journal, ledger, manifest):
 
-    Given an array full of QSOs, dump them as JSON to a file.
-    File is named mailing-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.json .
+    Note that a list of QSOs has been printed (or saved as images) in journal, ledger and
+    manifest, where they're given.
 
     Returns: nothing.
 
     """
-    with open(f"mailing-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.json", "w",
-        encoding="latin-1") as json_file:
-        json_file.write(json.dumps(qsos_parsed, indent=4))
+    if not qsos:
+        return
+    if journal is not None:
+        journal.mark(qsos, 'printed')
+    if ledger is not None and not MAKE_IMAGES:
+        ledger.record(qsos)
+    if manifest is not None:
+        manifest.write(qsos)
 
-def parse_db():
-    """parse_db():
+def mark_sent(file_object, ledger):
+    """mark_sent(file_object, ledger):
 
-    Parse EN.dat and HD.dat, in the current working directory, into a SQLite DB named uls.json.
-    Only pull out fields relevant to this program.
+    Add every QSO in an ADIF file to ledger (a qsl_ledger.SentLedger) without printing anything,
+    e.g. to catch the ledger up with cards that went out before it was kept.
 
     Returns: nothing.
 
     """
+    count = 0
+    for chunk in _chunks(read_qsos(file_object), LOOKUP_CHUNK):
+        ledger.record(chunk)
+        count += len(chunk)
+    print(f"Marked {count} QSOs as sent")
+
+def upgrade_db(con):
+    """upgrade_db(con):
+
+    Create the tables in uls.db if they don't exist yet, and bring an existing uls.db up to
+    SCHEMA_VERSION in place. The version is stamped in SQLite's user_version.
+
+    Returns: nothing.
+
+    """
+    cur = con.cursor()
+    version = cur.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    columns = cur.execute("PRAGMA table_info(amateurs)").fetchall()
+    if not columns:
+        cur.execute(AMATEURS_TABLE_SQL.format(table="amateurs"))
+    elif version < 1 and not any(column[5] for column in columns):
+        # Version 0: no primary key on identifier and no indexes. Copy into a new table,
+        # keeping the last row seen for each identifier, the way parse_db() always has.
+        print("Upgrading uls.db to schema version 1")
+        cur.execute(AMATEURS_TABLE_SQL.format(table="amateurs_v1"))
+        cur.execute("INSERT OR REPLACE INTO amateurs_v1 " +
+            "(identifier, callsign, firstname, lastname, address, city, state, zipcode, active) " +
+            "SELECT identifier, callsign, firstname, lastname, address, city, state, zipcode, " +
+            "active FROM amateurs ORDER BY rowid")
+        cur.execute("DROP TABLE amateurs")
+        cur.execute("ALTER TABLE amateurs_v1 RENAME TO amateurs")
+    cur.execute(CALLSIGN_INDEX_SQL)
+
+    # Version 2: keep track of which weekly dump and daily deltas have been loaded.
+    cur.execute(UPDATES_TABLE_SQL)
+
+    cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    con.commit()
+
+def uls_generation(con):
+    """uls_generation(con):
+
+    Identify the current contents of uls.db, for invalidating anything derived from it. This
+    changes whenever uls.db is rebuilt or has a delta applied.
+
+    Returns: a string.
+
+    """
+    row = con.execute("SELECT max(rowid), max(applied_at) FROM uls_updates").fetchone()
+    return f"{row[0]}:{row[1]}"
+
+def export_index(path=callsign_index.DEFAULT_INDEX_PATH):
+    """export_index(path=callsign_index.DEFAULT_INDEX_PATH):
+
+    Write the active records in uls.db out to a callsign_index file at path, with their
+    addresses run through format_address(), stamped with the current uls_generation() and
+    uls.db's size and modification time, for lookups with --index.
+
+    Returns: nothing.
+
+    """
+    con = sqlite3.connect('uls.db')
+    con.row_factory = sqlite3.Row
+    upgrade_db(con)
+    generation = uls_generation(con)
+    # upgrade_db() has committed anything it changed, and reading won't change uls.db again.
+    stat = os.stat('uls.db')
+    started = time.perf_counter()
+    rows = ((row['callsign'],) + tuple(format_address(row).values()) for row in
+        con.execute("SELECT callsign, firstname, lastname, address, city, state, zipcode " +
+        "FROM amateurs WHERE active = 1 ORDER BY callsign"))
+    count = callsign_index.write_index(rows, path, generation,
+        (stat.st_size, stat.st_mtime_ns))
+    con.close()
+    print(f"Exported {count} active callsigns to {path} ({os.path.getsize(path)} bytes) " +
+        f"in {time.perf_counter() - started:.1f}s")
+
+def check_index(index):
+    """check_index(index):
+
+    Make sure a callsign_index.CallsignIndex was exported from the current uls.db, if there is
+    a uls.db here to compare it with. A stale index stops the run. uls.db is only opened (to
+    compare generations) if its size or modification time has changed since the export.
+
+    Returns: nothing.
+
+    """
+    if not os.path.exists('uls.db'):
+        return
+    stat = os.stat('uls.db')
+    if (stat.st_size, stat.st_mtime_ns) == index.source:
+        return
+    con = sqlite3.connect('uls.db')
+    upgrade_db(con)
+    generation = uls_generation(con)
+    con.close()
+    if generation != index.generation:
+        print("==========ERROR==========")
+        print("The callsign index is out of date with uls.db, which has been rebuilt or had a " +
+            "delta applied since it was exported. Run with --export_index again.")
+        sys.exit(1)
+
+def _dat_batches(file_object, batch_size):
+    """_dat_batches(file_object, batch_size):
+
+    Read a pipe-delimited FCC ULS .dat file a chunk at a time.
+
+    Returns: a generator of lists, each holding up to batch_size csv rows.
+
+    """
+    reader = csv.reader(file_object, delimiter='|')
+    batch = []
+    for row in reader:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def en_record(row):
+    """en_record(row):
+
+    Pull the fields this program cares about out of a single EN.dat row.
+
+    Returns: a tuple of (identifier, callsign, firstname, lastname, address, city, state,
+    zipcode), in the column order of the amateurs table.
+
+    """
+    address = row[15].title().replace('"', '')
+    # PO boxes are, hilariously, stored in a weird way;
+    # see, e.g., W7WIL, who has PO Box 1651.
+    if len(address) < 5 and len(row) > 19 and len(row[19]) >= 1:
+        pobox = row[19].replace('"', '')
+        address = f"PO Box {pobox}"
+    return (row[1], row[4], row[8].title().replace('"', ''), row[10].title().replace('"', ''),
+        address, row[16].title().replace('"', ''), row[17].replace('"', ''), row[18])
+
+def hd_record(row):
+    """hd_record(row):
+
+    Pull the license status out of a single HD.dat row.
+
+    Returns: a tuple of (active, identifier), where active is 1 for an active license and 0
+    otherwise.
+
+    """
+    return (1 if row[5] == 'A' else 0, row[1])
+
+def en_columns(batch, active):
+    """en_columns(batch, active):
+
+    The column-at-a-time version of en_record(): pull each field out of a whole batch of
+    EN.dat rows at once and clean it up with map(), rather than row by row. active is a dict of
+    identifier to 1 or 0, from hd_columns(); licensees without an HD.dat row are inactive.
+
+    Returns: a list of row tuples, in the column order of the amateurs table, active included.
+
+    """
+    identifiers = list(map(itemgetter(1), batch))
+    addresses = list(map(str.title, map(itemgetter(15), batch)))
+    # PO boxes are, hilariously, stored in a weird way;
+    # see, e.g., W7WIL, who has PO Box 1651.
+    for i, address in enumerate(addresses):
+        if len(address.replace('"', '')) < 5:
+            row = batch[i]
+            if len(row) > 19 and row[19]:
+                addresses[i] = f"PO Box {row[19]}"
+    return list(zip(identifiers, map(itemgetter(4), batch),
+        _strip_quotes(map(str.title, map(itemgetter(8), batch))),
+        _strip_quotes(map(str.title, map(itemgetter(10), batch))),
+        _strip_quotes(addresses),
+        _strip_quotes(map(str.title, map(itemgetter(16), batch))),
+        _strip_quotes(map(itemgetter(17), batch)),
+        map(itemgetter(18), batch),
+        map(active.get, identifiers, itertools.repeat(0))))
+
+def _strip_quotes(column):
+    """Remove double quotes from every string in a column."""
+    return map(str.replace, column, itertools.repeat('"'), itertools.repeat(''))
+
+def hd_columns(batch, active):
+    """hd_columns(batch, active):
+
+    The column-at-a-time version of hd_record(): add the license status of a batch of HD.dat
+    rows to active, a dict of identifier to 1 (active) or 0 (anything else).
+
+    Returns: nothing.
+
+    """
+    active.update(zip(map(itemgetter(1), batch),
+        map(int, map('A'.__eq__, map(itemgetter(5), batch)))))
+
+class _Throughput:
+    """Prints a running rows/sec figure while a .dat file is loaded."""
+
+    def __init__(self, label):
+        self.label = label
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.next_report = PROGRESS_EVERY
+
+    def add(self, rows):
+        """Count another batch of rows, printing progress every PROGRESS_EVERY rows."""
+        self.rows += rows
+        if self.rows >= self.next_report:
+            self.next_report += PROGRESS_EVERY
+            self.report()
+
+    def report(self, final=False):
+        """Print the rows handled so far and the rate."""
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        suffix = " total" if final else ""
+        print(f"  {self.label}: {self.rows}{suffix} rows ({self.rows / elapsed:.0f} rows/sec)")
+
+def _load_dat(cur, path, sql, to_record, batch_size):
+    """_load_dat(cur, path, sql, to_record, batch_size):
+
+    Stream a ULS .dat file through to_record() and into the DB with executemany(sql, ...).
+
+    Returns: nothing.
+
+    """
+    with open(path, 'r', encoding="latin-1") as datfile:
+        print(f"Reading {path}")
+        progress = _Throughput(os.path.basename(path))
+        for batch in _dat_batches(datfile, batch_size):
+            cur.executemany(sql, [to_record(row) for row in batch])
+            progress.add(len(batch))
+        progress.report(final=True)
+
+def _open_for_load(max_memory, durable=False):
+    """_open_for_load(max_memory, durable=False):
+
+    Open uls.db tuned for a bulk load: a page cache of half of max_memory MB, and no journal
+    or fsync until _finish_load() is called. That's only safe for a load from scratch, which
+    can simply be run again if it's interrupted; if durable is set, the normal rollback journal
+    is kept instead, and everything up to _finish_load() happens in one transaction.
+
+    Returns: a tuple of (connection, batch size to use for executemany()).
+
+    """
+    batch_size = max(1000, max_memory * 1024 * 1024 // 2 // ROW_BYTES_ESTIMATE)
+    print("Opening DB")
+    con = sqlite3.connect('uls.db')
+    con.execute(f"PRAGMA cache_size = -{max_memory * 1024 // 2}")
+    if not durable:
+        con.execute("PRAGMA journal_mode = OFF")
+        con.execute("PRAGMA synchronous = OFF")
+    upgrade_db(con)
+    if durable:
+        con.execute("BEGIN")
+    return con, batch_size
+
+def _finish_load(con, kind, dump_date):
+    """_finish_load(con, kind, dump_date):
+
+    Record that a weekly dump or daily delta from dump_date has been loaded, commit, and put
+    uls.db back into its normal, durable journaling mode.
+
+    Returns: nothing.
+
+    """
+    con.execute("INSERT INTO uls_updates (kind, dump_date, applied_at) VALUES (?, ?, ?)",
+        (kind, dump_date, datetime.now().isoformat()))
+    con.commit()
+    con.execute("PRAGMA journal_mode = DELETE")
+    con.execute("PRAGMA synchronous = FULL")
+    con.close()
+
+def dump_date(directory):
+    """dump_date(directory):
+
+    Work out what date the ULS files in directory were generated. The FCC zips include a
+    "counts" file whose first line reads, e.g., "File Creation Date: Sun Oct 16 11:06:48 EDT
+    2022"; if that isn't there, fall back on the modification time of EN.dat.
+
+    Returns: the date, as a YYYY-MM-DD string.
+
+    """
+    counts_path = os.path.join(directory, 'counts')
+    if os.path.isfile(counts_path):
+        with open(counts_path, 'r', encoding="latin-1") as counts:
+            for line in counts:
+                if line.startswith("File Creation Date:"):
+                    fields = line.split(':', 1)[1].split()
+                    try:
+                        return datetime.strptime(f"{fields[1]} {fields[2]} {fields[-1]}",
+                            "%b %d %Y").strftime('%Y-%m-%d')
+                    except (IndexError, ValueError):
+                        break
+    mtime = os.path.getmtime(os.path.join(directory, 'EN.dat'))
+    return datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')
+
+def _load_columnar(con, batch_size):
+    """_load_columnar(con, batch_size):
+
+    Load EN.dat and HD.dat with en_columns() and hd_columns(). HD.dat is read first, into a
+    dict of identifier to active status, so that each EN.dat row can be inserted complete in a
+    single pass, with no UPDATE pass afterwards. That dict holds an entry per license (roughly
+    a hundred bytes each), which is on top of max_memory.
+
+    Returns: nothing.
+
+    """
+    active = {}
+    with open('HD.dat', 'r', encoding="latin-1") as hdfile:
+        print("Reading HD.dat")
+        progress = _Throughput("HD.dat")
+        for batch in _dat_batches(hdfile, batch_size):
+            hd_columns(batch, active)
+            progress.add(len(batch))
+        progress.report(final=True)
+
     with open('EN.dat', 'r', encoding="latin-1") as enfile:
-        with open('HD.dat', 'r', encoding="latin-1") as hdfile:
-            records = {}
-
-            print("Reading EN.dat")
-            reader = csv.reader(enfile, delimiter='|')
-            for row in reader:
-                record = {}
-                record['identifier'] = row[1]
-                record['callsign'] = row[4]
-                record['firstname'] = row[8].title().replace('"', '')
-                record['lastname'] = row[10].title().replace('"', '')
-                record['address'] = row[15].title().replace('"', '')
-                record['city'] = row[16].title().replace('"', '')
-                record['state'] = row[17].replace('"', '')
-                record['zipcode'] = row[18]
-
-                # PO boxes are, hilariously, stored in a weird way;
-                # see, e.g., W7WIL, who has PO Box 1651.
-                if len(record['address']) < 5 and len(row) > 19 and len(row[19]) >= 1:
-                    pobox = row[19].replace('"', '')
-                    record['address'] = f"PO Box {pobox}"
-
-                records[record['identifier']] = record
-
-            print("Reading HD.dat")
-            reader = csv.reader(hdfile, delimiter='|')
-            for row in reader:
-                identifier = row[1]
-                active = row[5]
-                if active == 'A':
-                    records[identifier]['active'] = 1
-                else:
-                    records[identifier]['active'] = 0
-
-            print("Opening DB")
-            con = sqlite3.connect('uls.db')
-            cur = con.cursor()
-            # Create table
-            cur.execute("CREATE TABLE IF NOT EXISTS amateurs" +
-                "(identifier text, callsign text, firstname text, lastname text, address text, " +
-                "city text, state text, zipcode text, active integer DEFAULT 0)")
-            con.commit()
-
-            for record in records.values():
-                cur.execute(" INSERT INTO amateurs " +
-                    "(identifier, callsign, firstname, lastname, address, city, state, zipcode, " +
-                    f"active) VALUES (\"{record['identifier']}\", \"{record['callsign']}\", " +
-                    f"\"{record['firstname']}\", \"{record['lastname']}\", " +
-                    f"\"{record['address']}\", \"{record['city']}\", \"{record['state']}\", "+
-                    f" \"{record['zipcode']}\", {record['active']});")
-
-            con.commit()
-            con.close()
-    print("Parsing FCC databases to SQLite complete.")
+        print("Reading EN.dat")
+        progress = _Throughput("EN.dat")
+        for batch in _dat_batches(enfile, batch_size):
+            con.executemany("INSERT OR REPLACE INTO amateurs " +
+                "(identifier, callsign, firstname, lastname, address, city, state, zipcode, " +
+                "active) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", en_columns(batch, active))
+            progress.add(len(batch))
+        progress.report(final=True)
+
+def parse_db(max_memory=DEFAULT_MAX_MEMORY_MB, engine='rows'):
+    """parse_db(max_memory=DEFAULT_MAX_MEMORY_MB, engine='rows'):
+
+    Parse EN.dat and HD.dat, in the current working directory, into a SQLite DB named uls.db.
+    Only pull out fields relevant to this program.
+
+    Both files are streamed in batches and written with executemany() inside a single
+    transaction, so peak memory is bounded by max_memory (in MB, roughly) rather than by the
+    size of the dump. Half of it goes to the SQLite page cache and half to the row batches.
+    Journaling and fsync are switched off during the load; if it's interrupted, delete uls.db
+    and run it again.
+
+    The 'rows' engine cleans up one row at a time and sets active status with a second, UPDATE
+    pass over HD.dat. The 'columnar' engine (see _load_columnar()) is faster, but needs memory
+    for the status of every license on top of max_memory.
+
+    Returns: nothing.
+
+    """
+    date = dump_date('.')
+    con, batch_size = _open_for_load(max_memory)
+    # The index is much cheaper to build once at the end than to maintain row by row.
+    con.execute("DROP INDEX IF EXISTS amateurs_callsign_active")
+
+    if engine == 'columnar':
+        _load_columnar(con, batch_size)
+    else:
+        _load_dat(con.cursor(), 'EN.dat', "INSERT OR REPLACE INTO amateurs " +
+            "(identifier, callsign, firstname, lastname, address, city, state, zipcode) " +
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", en_record, batch_size)
+        _load_dat(con.cursor(), 'HD.dat', "UPDATE amateurs SET active = ? WHERE identifier = ?",
+            hd_record, batch_size)
+
+    print("Indexing callsigns")
+    con.execute(CALLSIGN_INDEX_SQL)
+    _finish_load(con, 'weekly', date)
+    print(f"Parsing FCC databases (dump of {date}) to SQLite complete.")
+
+def apply_delta(directory, max_memory=DEFAULT_MAX_MEMORY_MB):
+    """apply_delta(directory, max_memory=DEFAULT_MAX_MEMORY_MB):
+
+    Apply an FCC daily transaction file (EN.dat and HD.dat, unzipped into directory) to an
+    existing uls.db. EN rows are upserted by unique system identifier, and HD rows update
+    whether that license is active. Deltas that have already been applied, or that are older
+    than the weekly dump uls.db was built from, are skipped. The delta is applied in a single
+    transaction, so if it's interrupted, uls.db is left as it was.
+
+    Returns: nothing.
+
+    """
+    date = dump_date(directory)
+    con, batch_size = _open_for_load(max_memory, durable=True)
+    weekly = con.execute("SELECT max(dump_date) FROM uls_updates WHERE kind = 'weekly'"
+        ).fetchone()[0]
+    applied = con.execute("SELECT 1 FROM uls_updates WHERE kind = 'delta' AND dump_date = ?",
+        (date,)).fetchone()
+    if weekly is None and con.execute("SELECT 1 FROM amateurs LIMIT 1").fetchone() is None:
+        print("uls.db is empty; run with --parse_db on a weekly dump before applying deltas.")
+        con.close()
+        sys.exit(1)
+    if applied or (weekly is not None and date <= weekly):
+        print(f"The delta from {date} is already reflected in uls.db, skipping it.")
+        con.close()
+        return
+
+    _load_dat(con.cursor(), os.path.join(directory, 'EN.dat'), "INSERT INTO amateurs " +
+        "(identifier, callsign, firstname, lastname, address, city, state, zipcode) " +
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (identifier) DO UPDATE SET " +
+        "callsign = excluded.callsign, firstname = excluded.firstname, " +
+        "lastname = excluded.lastname, address = excluded.address, city = excluded.city, " +
+        "state = excluded.state, zipcode = excluded.zipcode", en_record, batch_size)
+    hd_path = os.path.join(directory, 'HD.dat')
+    if os.path.isfile(hd_path):
+        _load_dat(con.cursor(), hd_path, "UPDATE amateurs SET active = ? WHERE identifier = ?",
+            hd_record, batch_size)
+
+    _finish_load(con, 'delta', date)
+    print(f"Applying the FCC delta of {date} to SQLite complete.")
+
+def megabytes(text):
+    """megabytes(text):
+
+    Parse a memory budget for argparse: a whole number of MB, at least 1.
+
+    Returns: the number.
+
+    """
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1 MB, not {text}")
+    return value
+
+class _TestPrinterDevice:
+    """_TestPrinterDevice(labels_per_job, jam_on_job=None):
+
+    A stand-in for a QL printer's connection, for run_tests(). It answers each print job of
+    labels_per_job labels the way the printer does, with a 'Printing completed' for each label
+    and then 'Waiting to receive', except for job number jam_on_job, which it answers with a
+    cutter jam.
+
+    """
+
+    def __init__(self, labels_per_job, jam_on_job=None):
+        self.labels_per_job = labels_per_job
+        self.jam_on_job = jam_on_job
+        self.jobs = 0
+        self.responses = []
+
+    @staticmethod
+    def _status(status_type, phase_type=0, error=0):
+        """A 32-byte status response, as brother_ql.reader.interpret_response() reads them."""
+        data = bytearray(32)
+        data[0:3] = b'\x80\x20\x42'
+        data[8], data[11], data[18], data[19] = error, 0x0A, status_type, phase_type
+        return bytes(data)
+
+    def write(self, instructions):
+        self.jobs += 1
+        if self.jobs == self.jam_on_job:
+            # Error information 1, bit 2: 'Tape cutter jam'; status type 2: 'Error occurred'.
+            self.responses = [self._status(2, error=1 << 2)]
+        else:
+            self.responses = [self._status(1)] * self.labels_per_job + [self._status(6)]
+
+    def read(self):
+        return self.responses.pop(0) if self.responses else b''
+
+    def dispose(self):
+        pass
+
+def run_tests():
+    """run_tests():
+
+    Run every module's self-checks, and check that bad QSOs and ZIP codes are skipped rather
+    than stopping the run. Then print a mailing of six labels, two to a print job, to a printer
+    that jams on the second job. The first two labels should be printed, journaled,
+    recorded in the ledger and written to the manifest; the jammed two should stay 'rendered'
+    and be left out of the ledger and the manifest, so that --resume prints them, along with the
+    two that never got to the printer.
+
+    Returns: nothing; raises AssertionError if a check fails.
+
+    """
+    for module in (adif_stream, callsign_index, mailing_journal, qsl_ledger, mailing_manifest):
+        module.run_tests()
+
+    good = "<MY_GRIDSQUARE:6>CN85pm<EOR>"
+    log = ("<EOH><CALL:4>K0AB<QSO_DATE:8>20221010<TIME_ON:4>1200" + good +
+        "<CALL:4>K1AB<QSO_DATE:8>20221010<TIME_ON:4>1200<MY_GRIDSQUARE:4>CN8X<EOR>" +
+        "<CALL:4>K2AB<QSO_DATE:8>20221010<TIME_ON:4>1200<EOR>" +
+        "<CALL:4>K3AB<QSO_DATE:6>221010<TIME_ON:4>1200" + good +
+        "<CALL:4>K4AB<QSO_DATE:8>20221010<TIME_ON:3>120" + good +
+        "<QSO_DATE:8>20221010<TIME_ON:4>1200" + good +
+        "<CALL:4>K6AB<QSO_DATE:8>20221010<TIME_ON:6>120000" + good)
+    with contextlib.redirect_stdout(io.StringIO()):
+        qsos = list(read_qsos(io.StringIO(log)))
+    assert [q_p['callsign'] for q_p in qsos] == ['K0AB', 'K6AB'], qsos
+    address = {'firstname': 'Ann', 'lastname': 'Bell', 'address': '1 Elm St', 'city': 'Boston',
+        'state': 'MA'}
+    found = {callsign: [dict(address, zip=zipcode)] for callsign, zipcode in
+        (('K0AB', '02101'), ('K1AB', '02101-1234'), ('K2AB', '0210'), ('K3AB', '0210A'))}
+    with contextlib.redirect_stdout(io.StringIO()):
+        addresses = _resolve_addresses(set(found), found)
+    assert [callsign for callsign in sorted(addresses) if addresses[callsign]] == \
+        ['K0AB', 'K1AB'], addresses
+
+    adif = "<EOH>" + "".join(f"<CALL:4>K{n}AB<QSO_DATE:8>20221010<TIME_ON:6>12000{n}" +
+        "<MY_GRIDSQUARE:4>CN85<FREQ:6>14.074<MODE:3>FT8<EOR>\n" for n in range(6))
+    real_printer = ql_printer.QLPrinter
+
+    def printer_with(device):
+        """A QLPrinter class whose connection is device."""
+        class TestPrinter(real_printer):
+            def __init__(self, *args, **kwargs):
+                super().__init__(model=qsl_config.PRINTER_MODEL, label=qsl_config.LABEL_SIZE,
+                    output_file=os.devnull)
+                self.device.dispose()
+                self.backend_name, self.device = 'test', device
+        return TestPrinter
+
+    def mailing(journal):
+        """The QSOs in adif, through journal, as parse_adif() would hand them on."""
+        qsos = list(journal.restore(dict(q_p, has_address=False)
+            for q_p in read_qsos(io.StringIO(adif))))
+        return journal.track(qsos)
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = mailing_journal.MailingJournal('/logs/test.adi',
+            os.path.join(directory, 'journal.db'))
+        ledger = qsl_ledger.SentLedger(os.path.join(directory, 'ledger.db'))
+        manifest = mailing_manifest.ManifestWriter(os.path.join(directory, 'mailing.jsonl'),
+            'printer', os.path.join(directory, 'index.db'))
+        try:
+            ql_printer.QLPrinter = printer_with(_TestPrinterDevice(2, jam_on_job=2))
+            with contextlib.redirect_stdout(io.StringIO()):
+                print_qsos(mailing(journal), batch=2, journal=journal, ledger=ledger,
+                    manifest=manifest)
+            raise AssertionError("a jammed print job didn't stop the run")
+        except ql_printer.PrinterError:
+            pass
+        finally:
+            ql_printer.QLPrinter = real_printer
+        statuses = [status for status, in journal.con.execute("SELECT status FROM labels " +
+            "ORDER BY position")]
+        assert statuses == ['printed'] * 2 + ['rendered'] * 2 + ['parsed'] * 2, statuses
+        sent = [callsign for callsign, in ledger.con.execute("SELECT callsign FROM sent")]
+        assert sorted(sent) == ['K0AB', 'K1AB'], sent
+        assert manifest.count == 2
+        journal.close()
+
+        journal = mailing_journal.MailingJournal('/logs/test.adi',
+            os.path.join(directory, 'journal.db'), resume=True)
+        try:
+            ql_printer.QLPrinter = printer_with(_TestPrinterDevice(2))
+            with contextlib.redirect_stdout(io.StringIO()):
+                resumed = mailing(journal)
+                assert [q_p['callsign'] for q_p in resumed] == ['K2AB', 'K3AB', 'K4AB', 'K5AB']
+                print_qsos(resumed, batch=2, journal=journal, ledger=ledger, manifest=manifest)
+        finally:
+            ql_printer.QLPrinter = real_printer
+        statuses = [status for status, in journal.con.execute("SELECT status FROM labels")]
+        assert statuses == ['printed'] * 6, statuses
+        assert manifest.count == 6
+        journal.close()
+        ledger.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            manifest.close()
+    print("adif_to_qsl: all tests passed")
 
 
 if __name__ == "__main__":
@@ -289,18 +1333,219 @@ if __name__ == "__main__":
         help='the path to the ADIF file', type=open)
     parser.add_argument('-p', '--parse_db', action='store_true',
         help='parse an FCC EN.dat and HD.dat database into a local SQLite db called uls.db')
-    parser.add_argument('-i', '--output_images', action='store_true',
+    parser.add_argument('--ingest', choices=('rows', 'columnar'), default='rows',
+        help='how --parse_db processes the dump: row by row (default), or a column at a time, ' +
+        'which is faster but needs more memory')
+    parser.add_argument('--apply_delta', metavar="directory",
+        help='apply an unzipped FCC daily transaction file (EN.dat and HD.dat) to uls.db')
+    parser.add_argument('--max_memory', metavar="MB", type=megabytes,
+        default=DEFAULT_MAX_MEMORY_MB,
+        help='rough cap on memory used by --parse_db and --apply_delta, in MB ' +
+        f'(default {DEFAULT_MAX_MEMORY_MB})')
+    parser.add_argument('--export_index', metavar="filename", nargs='?',
+        const=callsign_index.DEFAULT_INDEX_PATH,
+        help='export the active records in uls.db to a compact, read-only callsign index ' +
+        f'(default {callsign_index.DEFAULT_INDEX_PATH}) for use with --index')
+    parser.add_argument('--index', metavar="filename", nargs='?',
+        const=callsign_index.DEFAULT_INDEX_PATH,
+        help='look addresses up in a callsign index from --export_index ' +
+        f'(default {callsign_index.DEFAULT_INDEX_PATH}) instead of uls.db')
+    parser.add_argument('--cache', metavar="filename", nargs='?',
+        const=callsign_cache.DEFAULT_CACHE_PATH,
+        help='keep looked-up addresses in an on-disk cache ' +
+        f'(default {callsign_cache.DEFAULT_CACHE_PATH}) for later runs')
+    parser.add_argument('--cache_size', metavar="N", type=int,
+        default=callsign_cache.DEFAULT_CACHE_SIZE,
+        help=f'most callsigns to keep in the cache (default {callsign_cache.DEFAULT_CACHE_SIZE})')
+    parser.add_argument('--group', action='store_true',
+        help='put all the QSOs with each station on one card (or a few, if there are lots)')
+    parser.add_argument('--group_by_address', action='store_true',
+        help='like --group, but one card per mailing address, even across callsigns')
+    parser.add_argument('--skip_sent', action='store_true',
+        help='leave out QSOs that cards have already been printed for, according to the ledger')
+    parser.add_argument('--ledger', metavar="filename", default=qsl_ledger.DEFAULT_LEDGER_PATH,
+        help='the ledger of QSOs cards have been printed for ' +
+        f'(default {qsl_ledger.DEFAULT_LEDGER_PATH})')
+    parser.add_argument('--mark_sent', metavar="filename", type=open,
+        help='add every QSO in this ADIF file to the ledger as sent, without printing anything')
+    parser.add_argument('--resume', action='store_true',
+        help='carry on with a mailing that stopped partway, skipping labels already printed')
+    parser.add_argument('--pipeline', action='store_true',
+        help='run reading, lookups, barcodes, rendering and printing side by side in threads, ' +
+        'and report on each stage')
+    parser.add_argument('--timings', action='store_true',
+        help='time each stage of the run (reading, lookups, barcodes, rendering, printing) and ' +
+        'print a table of where the time went, with counters, at the end')
+    parser.add_argument('--trace', metavar="filename",
+        help='like --timings, and also write every timed span to this file as a Chrome trace, ' +
+        'for chrome://tracing or https://ui.perfetto.dev/')
+    parser.add_argument('--profile', metavar="filename", nargs='?', const='adif_to_qsl.prof',
+        help='profile the run (its main thread) with cProfile, print the top functions, and ' +
+        'save the stats for pstats (default adif_to_qsl.prof)')
+    parser.add_argument('-j', '--jobs', metavar="N", type=int, default=1,
+        help='render cards in N worker processes (default 1); printing stays in order')
+    parser.add_argument('--print_to_file', metavar="filename",
+        help='write the label printer\'s raster data to this file instead of printing')
+    parser.add_argument('--batch', metavar="N", type=int, default=1,
+        help='send N labels to the printer per print job (default 1)')
+    parser.add_argument('--cut_every', metavar="N", type=int, default=1,
+        help='cut after every N labels, or 0 to cut only at the end of each job (default 1)')
+    parser.add_argument('--lookup_serial', metavar="serial", type=int,
+        help='show which callsign and QSO an IMb serial number was issued for')
+    parser.add_argument('--gzip_manifest', action='store_true',
+        help='gzip the mailing manifest')
+    parser.add_argument('--lookup_mailed', metavar="callsign_or_serial",
+        help='show the labels mailed to a callsign, or with an IMb serial number, according to ' +
+        'the mailing manifests')
+    parser.add_argument('--mono', action='store_true',
+        help='draw cards in pure black and white, without anti-aliasing, which is quicker to ' +
+        'render and print')
+    parser.add_argument('--image_format', choices=('png', 'fastpng', 'pbm'), default='png',
+        help='what -i saves cards as: png (default), fastpng (quicker to write, but larger), ' +
+        'or pbm (1-bit; implies --mono)')
+    outputs = parser.add_mutually_exclusive_group()
+    outputs.add_argument('-i', '--output_images', action='store_true',
         help=f'Create images and store them in a {QSL_CARD_PATH} directory. Do not print')
+    outputs.add_argument('--sheets', metavar="filename",
+        help='lay the cards out several to a page in one multi-page PDF or TIFF (by its ' +
+        'extension), to print on a sheet printer and mail, instead of on the label printer')
+    parser.add_argument('--paper', choices=sorted(card_sheets.PAPER_SIZES),
+        default=card_sheets.DEFAULT_PAPER,
+        help=f'paper size for --sheets (default {card_sheets.DEFAULT_PAPER})')
+    parser.add_argument('--sheet_grid', metavar="COLUMNSxROWS", type=card_sheets.grid_size,
+        help='cards to a page for --sheets, e.g. 2x3 (default as many as fit)')
+    parser.add_argument('--sheet_margin', metavar="inches", type=float,
+        default=card_sheets.DEFAULT_MARGIN,
+        help=f'margin around each page for --sheets (default {card_sheets.DEFAULT_MARGIN})')
+
+    parser.add_argument('--run_tests', action='store_true',
+        help='run the self-checks, including a print job that fails partway')
 
     args = parser.parse_args()
     MAKE_IMAGES = args.output_images
+    mono = args.mono or args.image_format == 'pbm'
+    run_timings = None
+    if args.timings or args.trace:
+        run_timings = timings.enable(trace=bool(args.trace))
+    if args.profile:
+        # At exit, so that a run that stops with sys.exit() is profiled too.
+        atexit.register(timings.finish_profile, timings.start_profile(), args.profile)
 
-    if args.parse_db:
-        parse_db()
+    if args.run_tests:
+        run_tests()
+    elif args.parse_db:
+        parse_db(args.max_memory, args.ingest)
+    elif args.apply_delta:
+        apply_delta(args.apply_delta, args.max_memory)
+    elif args.export_index:
+        export_index(args.export_index)
+    elif args.mark_sent:
+        ledger = qsl_ledger.SentLedger(args.ledger)
+        mark_sent(args.mark_sent, ledger)
+        ledger.close()
+    elif args.lookup_mailed:
+        manifests = mailing_manifest.ManifestIndex()
+        if args.lookup_mailed.isdigit():
+            allocator = serial_allocator.SerialAllocator(qsl_config.MY_MAILER_ID)
+            wanted = {'serial': allocator.format(int(args.lookup_mailed))}
+            allocator.close()
+        else:
+            wanted = {'callsign': args.lookup_mailed}
+        mailed = manifests.find(**wanted)
+        if not mailed:
+            # Labels that only went to images or a file weren't mailed, but say so.
+            previews = manifests.find(**wanted, mailed=False)
+            manifests.close()
+            print(f"Nothing in the mailing manifests was mailed to {args.lookup_mailed}" +
+                (f" ({len(previews)} labels went only to images or a file)." if previews else "."))
+            sys.exit(1)
+        manifests.close()
+        for path, label in mailed:
+            qsos = label.get('qsos', [label])
+            print(f"{', '.join(label.get('callsigns', [label['callsign']]))}: " +
+                f"{len(qsos)} QSO{'s' if len(qsos) > 1 else ''} from {label['date']}, " +
+                f"serial {label.get('serial') or 'none'}, " +
+                f"{'on ' + label['output'] + ', ' if 'output' in label else ''}in {path}")
+    elif args.lookup_serial is not None:
+        allocator = serial_allocator.SerialAllocator(qsl_config.MY_MAILER_ID)
+        issued = allocator.lookup(args.lookup_serial)
+        serial = allocator.format(args.lookup_serial)
+        allocator.close()
+        if issued is None:
+            print(f"Serial {serial} hasn't been issued.")
+            sys.exit(1)
+        print(f"Serial {serial} was issued on {issued['issued_on']} for the QSO with " +
+            f"{issued['callsign']} on {issued['qso_date']} at {issued['qso_time']}.")
     elif args.file:
-        qsos = parse_adif(args.file)
-        print_qsos(qsos)
-        dump_qsos(qsos)
+        sheets = None
+        if args.sheets:
+            try:
+                sheets = card_sheets.SheetWriter(args.sheets, (CARD_WIDTH, CARD_HEIGHT), CARD_DPI,
+                    args.paper, args.sheet_grid, args.sheet_margin, mono)
+            except ValueError as error:
+                print(error)
+                sys.exit(1)
+        allocator = serial_allocator.SerialAllocator(qsl_config.MY_MAILER_ID)
+        cache = None
+        if args.cache:
+            cache = callsign_cache.CallsignCache(args.cache, args.cache_size)
+        index = None
+        if args.index:
+            index = callsign_index.CallsignIndex(args.index)
+        group = None
+        if args.group_by_address:
+            group = 'address'
+        elif args.group:
+            group = 'callsign'
+        journal = mailing_journal.MailingJournal(os.path.abspath(args.file.name),
+            resume=args.resume)
+        ledger = qsl_ledger.SentLedger(args.ledger)
+        stages = pipeline.Pipeline() if args.pipeline else None
+        if args.sheets:
+            output = 'sheets'
+        elif args.output_images:
+            output = 'images'
+        else:
+            output = 'file' if args.print_to_file else 'printer'
+        manifest = mailing_manifest.ManifestWriter(
+            mailing_manifest.manifest_path(args.gzip_manifest), output)
+        failed = None
+        try:
+            print_qsos(parse_adif(args.file, cache, allocator, index, group, journal,
+                ledger if args.skip_sent else None, stages), args.jobs, args.print_to_file,
+                args.batch, args.cut_every, journal, ledger, stages, args.image_format, mono,
+                sheets, manifest)
+        except ql_printer.PrinterError as error:
+            failed = f"{error} The labels in that print job weren't marked printed; once the " + \
+                "printer's sorted out, run again with --resume to print them."
+        except serial_allocator.SerialsExhausted as error:
+            failed = f"{error} There are no serial numbers left to give the rest of the " + \
+                "labels; once older serials are free again, run again with --resume."
+        finally:
+            if stages is not None:
+                stages.close()
+                stages.report()
+            if sheets is not None:
+                sheets.close()
+            manifest.close()
+            if run_timings is not None:
+                run_timings.report()
+                if args.trace:
+                    run_timings.write_trace(args.trace)
+        journal.report()
+        journal.close()
+        ledger.close()
+        allocator.close()
+        if index is not None:
+            index.close()
+        if cache:
+            cache.report()
+            cache.close()
+        if failed is not None:
+            print("==========ERROR==========")
+            print(failed)
+            sys.exit(1)
     else:
-        print("You need to either use the -f option or the -p option. Use -h for help.")
+        print("You need to use the -f, -p, --apply_delta, --export_index, --mark_sent, " +
+            "--lookup_serial, --lookup_mailed or --run_tests option. Use -h for help.")
         sys.exit(1)
@@ -0,0 +1,80 @@
+#! env python3
+"""
+Benchmark for card output formats: how long a card takes to draw and save, and how big it is,
+in each format a card can be written in, anti-aliased or with --mono. For the two formats that
+go to the printer (raw grayscale and 1-bit PBM), it also times turning a card into the
+printer's 1-bit raster with QLPrinter.queue_card().
+
+Run from anywhere: python3 benchmarks/bench_formats.py [number of cards]
+
+"""
+
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adif_to_qsl
+import ql_printer
+import qsl_config
+from bench_render import SAMPLE_QSO
+
+# (label, rotated for the printer, image_format, mono)
+FORMATS = [
+    ('png', False, 'png', False),
+    ('fastpng', False, 'fastpng', False),
+    ('png --mono', False, 'png', True),
+    ('fastpng --mono', False, 'fastpng', True),
+    ('pbm', False, 'pbm', True),
+    ('printer gray', True, 'gray', False),
+    ('printer pbm', True, 'pbm', True),
+]
+
+
+def time_format(rotate, image_format, mono, cards):
+    """time_format(rotate, image_format, mono, cards):
+
+    Render SAMPLE_QSO cards times over, in image_format.
+
+    Returns: a tuple of (milliseconds per card, bytes per card, the last card).
+
+    """
+    adif_to_qsl.render_card(SAMPLE_QSO, rotate, image_format, mono) # warm up
+    started = time.perf_counter()
+    for _ in range(cards):
+        card = adif_to_qsl.render_card(SAMPLE_QSO, rotate, image_format, mono)
+    return (time.perf_counter() - started) * 1000 / cards, len(card), card
+
+def time_raster(card, mono, cards):
+    """time_raster(card, mono, cards):
+
+    Queue card for the printer cards times over, as print_qsos() would.
+
+    Returns: milliseconds per card.
+
+    """
+    printer = ql_printer.QLPrinter(model=qsl_config.PRINTER_MODEL, label=qsl_config.LABEL_SIZE,
+        output_file=os.devnull)
+    started = time.perf_counter()
+    for _ in range(cards):
+        if mono:
+            size, raster = ql_printer.read_pbm(card)
+            printer.queue_card(raster, size, bilevel=True)
+        else:
+            printer.queue_card(card, (adif_to_qsl.CARD_HEIGHT, adif_to_qsl.CARD_WIDTH))
+        printer.queued.clear()
+    elapsed = time.perf_counter() - started
+    printer.close()
+    return elapsed * 1000 / cards
+
+
+if __name__ == "__main__":
+    CARDS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"{CARDS} cards")
+    print(f"  {'format':16} {'ms/card':>9} {'bytes/card':>11} {'raster ms/card':>15}")
+    for label, rotate, image_format, mono in FORMATS:
+        per_card, size, card = time_format(rotate, image_format, mono, CARDS)
+        raster = f"{time_raster(card, mono, CARDS):15.2f}" if rotate else ''
+        print(f"  {label:16} {per_card:9.2f} {size:11d} {raster}")
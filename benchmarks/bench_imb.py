@@ -0,0 +1,70 @@
+#! env python3
+"""
+Benchmark for Intelligent Mail barcode encoding: the original one-at-a-time imb.encode() path
+(bit-by-bit crc11(), to_bytes(), make_bars()) against imb.encode_many().
+
+Run from anywhere: python3 benchmarks/bench_imb.py [number of pieces]
+
+"""
+
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import imb
+import qsl_config
+
+
+def legacy_encode(barcode_id, service_type_id, mailer_id, serial, delivery):
+    """legacy_encode(barcode_id, service_type_id, mailer_id, serial, delivery):
+
+    Encode a barcode the way imb.encode() did before encode_many().
+
+    Returns: the barcode, as a string of A, D, F and T.
+
+    """
+    if str(mailer_id)[0] == '9':
+        tracking = '%02d%03d%09d%06d' % (barcode_id, service_type_id, mailer_id, serial)
+    else:
+        tracking = '%02d%03d%06d%09d' % (barcode_id, service_type_id, mailer_id, serial)
+    n = imb.convert_tracking_code(imb.convert_routing_code(delivery), tracking)
+    fcs = imb.crc11(imb.to_bytes(n, 13))
+    codewords = imb.binary_to_codewords(n)
+    codewords[9] *= 2
+    if fcs & (1<<10):
+        codewords[0] += 659
+    code = [imb.tab5[b] if b < 1287 else imb.tab2[b-1287] for b in codewords]
+    for i in range(10):
+        if fcs & 1<<i:
+            code[i] = code[i] ^ 0x1fff
+    return imb.make_bars(code)
+
+
+if __name__ == "__main__":
+    PIECES = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    ids = (int(qsl_config.BARCODE_ID), int(qsl_config.SERVICE_ID), int(qsl_config.MY_MAILER_ID))
+    rng = random.Random(0)
+    serials = [rng.randrange(1000000) for _ in range(PIECES)]
+    deliveries = [rng.choice(['', f"{rng.randrange(100000):05d}", f"{rng.randrange(10**9):09d}",
+        f"{rng.randrange(10**11):011d}"]) for _ in range(PIECES)]
+
+    started = time.perf_counter()
+    before = [legacy_encode(*ids, serial, delivery)
+        for serial, delivery in zip(serials, deliveries)]
+    legacy_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    after = imb.encode_many(*ids, serials, deliveries)
+    many_elapsed = time.perf_counter() - started
+
+    if before != after:
+        print("encode_many() doesn't match the original encoder!")
+        sys.exit(1)
+    print(f"{PIECES} pieces")
+    print(f"  before (imb.encode, one at a time): {PIECES / legacy_elapsed:10.0f} barcodes/sec")
+    print(f"  after  (imb.encode_many):           {PIECES / many_elapsed:10.0f} barcodes/sec")
+    print(f"  speedup: {legacy_elapsed / many_elapsed:.2f}x")
@@ -0,0 +1,90 @@
+#! env python3
+"""
+Benchmark for address lookups: uls.db through lookup_callsigns() against an index from
+--export_index through lookup_callsigns_index(). Reports what it costs to open each one and
+how many callsigns a second each resolves.
+
+Run from the directory holding uls.db: python3 benchmarks/bench_index.py [number of callsigns]
+
+uls.idx is exported there first if it's missing or out of date.
+
+"""
+
+
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adif_to_qsl
+import callsign_index
+
+
+def open_sqlite():
+    """Open uls.db the way lookup_addresses() does."""
+    con = sqlite3.connect('uls.db')
+    con.row_factory = sqlite3.Row
+    adif_to_qsl.upgrade_db(con)
+    adif_to_qsl.uls_generation(con)
+    return con
+
+def time_lookups(lookup, callsigns):
+    """time_lookups(lookup, callsigns):
+
+    Resolve callsigns with lookup(), LOOKUP_CHUNK at a time, as lookup_addresses() would.
+
+    Returns: a tuple of (seconds taken, the addresses found).
+
+    """
+    found = {}
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for start in range(0, len(callsigns), adif_to_qsl.LOOKUP_CHUNK):
+            found.update(lookup(set(callsigns[start:start + adif_to_qsl.LOOKUP_CHUNK])))
+    return time.perf_counter() - started, found
+
+
+if __name__ == "__main__":
+    LOOKUPS = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    con = open_sqlite()
+    generation = adif_to_qsl.uls_generation(con)
+    callsigns = [row[0] for row in con.execute("SELECT callsign FROM amateurs")]
+    con.close()
+    callsigns = random.Random(0).sample(callsigns, min(LOOKUPS, len(callsigns)))
+
+    path = callsign_index.DEFAULT_INDEX_PATH
+    try:
+        stale = callsign_index.CallsignIndex(path).generation != generation
+    except (OSError, ValueError):
+        stale = True
+    if stale:
+        adif_to_qsl.export_index(path)
+
+    started = time.perf_counter()
+    con = open_sqlite()
+    sqlite_open = time.perf_counter() - started
+    before, from_sqlite = time_lookups(lambda wanted: adif_to_qsl.lookup_callsigns(con, wanted),
+        callsigns)
+
+    started = time.perf_counter()
+    index = callsign_index.CallsignIndex(path)
+    adif_to_qsl.check_index(index)
+    index_open = time.perf_counter() - started
+    after, from_index = time_lookups(
+        lambda wanted: adif_to_qsl.lookup_callsigns_index(index, wanted), callsigns)
+
+    if from_sqlite != from_index:
+        print("The callsign index doesn't match uls.db!")
+        sys.exit(1)
+    print(f"{len(callsigns)} callsigns; uls.db is {os.path.getsize('uls.db')} bytes, " +
+        f"{path} is {os.path.getsize(path)} bytes")
+    print(f"  before (uls.db):  opened in {sqlite_open * 1000:7.2f} ms, " +
+        f"{len(callsigns) / before:8.0f} lookups/sec")
+    print(f"  after  ({path}): opened in {index_open * 1000:7.2f} ms, " +
+        f"{len(callsigns) / after:8.0f} lookups/sec")
+    print(f"  speedup: {before / after:.2f}x")
@@ -0,0 +1,102 @@
+#! env python3
+"""
+Benchmark for --parse_db: the row-at-a-time ingest (en_record(), then an UPDATE pass over
+HD.dat) against the columnar one (HD.dat into a dict first, then en_columns()).
+
+Run from anywhere: python3 benchmarks/bench_ingest.py [directory with EN.dat and HD.dat]
+
+Without a directory, a synthetic dump of SYNTHETIC_ROWS licenses is made in a temporary
+directory. Each engine loads into its own fresh uls.db there, and the two are checked to match.
+
+"""
+
+
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adif_to_qsl
+
+SYNTHETIC_ROWS = 300000
+
+
+def make_dump(directory, rows):
+    """make_dump(directory, rows):
+
+    Write EN.dat and HD.dat files with rows licenses into directory, with a mix of street
+    addresses and PO boxes, and of active and expired licenses.
+
+    Returns: nothing.
+
+    """
+    rng = random.Random(0)
+    with open(os.path.join(directory, 'EN.dat'), 'w', encoding='latin-1') as enfile, \
+        open(os.path.join(directory, 'HD.dat'), 'w', encoding='latin-1') as hdfile:
+        for i in range(rows):
+            identifier = 1000 + i
+            callsign = f"K{i}X"
+            if rng.random() < 0.1:
+                street, pobox = '', str(rng.randrange(1, 10000))
+            else:
+                street, pobox = f"{rng.randrange(1, 10000)} \"MAIN\" ST", ''
+            enfile.write(f"EN|{identifier}|||{callsign}|L|||JOHN||O'SMITH|||||{street}|" +
+                f"SPRINGFIELD|OR|{rng.randrange(100000):05d}|{pobox}|\n")
+            status = 'A' if rng.random() < 0.8 else 'E'
+            hdfile.write(f"HD|{identifier}|||{callsign}|{status}\n")
+
+def time_engine(directory, engine):
+    """time_engine(directory, engine):
+
+    Load the dump in directory into a fresh uls.db with parse_db(engine=engine).
+
+    Returns: a tuple of (seconds taken, every amateurs row in identifier order).
+
+    """
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        if os.path.exists('uls.db'):
+            os.remove('uls.db')
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            adif_to_qsl.parse_db(engine=engine)
+        elapsed = time.perf_counter() - started
+        con = sqlite3.connect('uls.db')
+        rows = con.execute("SELECT * FROM amateurs ORDER BY identifier").fetchall()
+        con.close()
+        os.remove('uls.db')
+    finally:
+        os.chdir(cwd)
+    return elapsed, rows
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as scratch:
+        if len(sys.argv) > 1:
+            # Work on links to the real dump, so that its own uls.db (if any) is left alone.
+            for name in ('EN.dat', 'HD.dat', 'counts'):
+                source = os.path.abspath(os.path.join(sys.argv[1], name))
+                if os.path.exists(source):
+                    os.symlink(source, os.path.join(scratch, name))
+        else:
+            make_dump(scratch, SYNTHETIC_ROWS)
+        with open(os.path.join(scratch, 'EN.dat'), 'rb') as enfile:
+            licenses = sum(1 for _ in enfile)
+
+        before, rows_before = time_engine(scratch, 'rows')
+        after, rows_after = time_engine(scratch, 'columnar')
+
+    if rows_before != rows_after:
+        print("The columnar ingest doesn't match the row-at-a-time one!")
+        sys.exit(1)
+    print(f"{licenses} licenses")
+    print(f"  before (--ingest rows):     {licenses / before:10.0f} licenses/sec")
+    print(f"  after  (--ingest columnar): {licenses / after:10.0f} licenses/sec")
+    print(f"  speedup: {before / after:.2f}x")
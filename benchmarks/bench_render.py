@@ -0,0 +1,82 @@
+#! env python3
+"""
+Micro-benchmark for card rendering: the original way (a fresh canvas and four Drawings per card,
+fonts named by relative path) against CardRenderer (a cloned template and one Drawing per card).
+
+Run from anywhere: python3 benchmarks/bench_render.py [number of cards]
+
+"""
+
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wand.image import Image
+from wand.drawing import Drawing
+from wand.color import Color
+
+import adif_to_qsl
+
+SAMPLE_QSO = {
+    'callsign': 'W7WIL', 'date': '2022-10-09', 'time': '18:04:00Z', 'qth': 'CN85',
+    'frequency': '14.074', 'power': '5W', 'mode': 'FT8', 'signal': 'S-10 R-12',
+    'notes': "POTA Activation\nfrom K-1234", 'has_address': True, 'firstname': 'Willamette',
+    'lastname': 'Valley', 'address': 'PO Box 1651', 'city': 'Salem', 'state': 'OR',
+    'zip': '97308-1651',
+    'imbcode': 'AADTFFDFTDADTAADAATFDTDDAAADDTDTTDAFADADDDTFFFDDTTTADFAAADFTDAADA',
+}
+
+
+def render_legacy(qso):
+    """render_legacy(qso):
+
+    Draw a card the way print_qsos() used to, before CardRenderer.
+
+    Returns: the card as PNG bytes.
+
+    """
+    res = 290
+    font_dir = adif_to_qsl.FONT_DIR
+    with Image(width=int(res*4.75), height=int(res*2.4), background = Color('white')) as img:
+        qso_text = (f"{qso['date']}\n{qso['time']}\n\n{qso['qth']}\n{qso['frequency']}\n" +
+            f"{qso['power']}\n{qso['mode']}\n{qso['signal']}\n\n{qso['notes']}")
+        for font, size, x, y, text in (
+            ('Inconsolata-Regular.ttf', 60, 0.1, 0.15, qso_text),
+            ('Inconsolata-Bold.ttf', 55, 2.0, 1.0,
+                f"{qso['firstname']} {qso['lastname']}, {qso['callsign']}"),
+            ('Inconsolata-Regular.ttf', 50, 2.0, 1.2,
+                f"{qso['address']}\n{qso['city']}, {qso['state']} {qso['zip']}"),
+            ('USPSIMBStandard.ttf', 54, 2.0, 1.5, qso['imbcode'])):
+            draw = Drawing()
+            draw.font = os.path.join(font_dir, font)
+            draw.font_size = size
+            draw.text(int(res * x), int(res * y), text)
+            draw(img)
+        return img.make_blob('png')
+
+def time_per_card(render, cards):
+    """time_per_card(render, cards):
+
+    Render SAMPLE_QSO with render(qso), cards times over.
+
+    Returns: milliseconds per card.
+
+    """
+    render(SAMPLE_QSO) # warm up, so one-time setup isn't counted against the first card
+    started = time.perf_counter()
+    for _ in range(cards):
+        render(SAMPLE_QSO)
+    return (time.perf_counter() - started) * 1000 / cards
+
+
+if __name__ == "__main__":
+    CARDS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    before = time_per_card(render_legacy, CARDS)
+    after = time_per_card(adif_to_qsl.render_card, CARDS)
+    print(f"{CARDS} cards")
+    print(f"  before (fresh canvas, four Drawings): {before:8.2f} ms/card")
+    print(f"  after  (CardRenderer template):       {after:8.2f} ms/card")
+    print(f"  speedup: {before / after:.2f}x")
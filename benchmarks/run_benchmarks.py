@@ -0,0 +1,283 @@
+#! env python3
+"""
+End-to-end benchmark of the whole pipeline, on synthetic data, with nothing but the local disk:
+a made-up FCC dump and ADIF log are generated in a scratch directory, and each stage is timed
+on its own.
+
+    parse_db            loading EN.dat/HD.dat into uls.db, row at a time
+    parse_db_columnar   the same, with --ingest columnar
+    adif_parse          reading the ADIF log with read_qsos()
+    lookup              lookup_addresses() against uls.db
+    imb_encode          imb.encode_many() for every QSO with an address
+    imb_verify          imb.verify_many() on those barcodes
+    render              drawing cards for the printer (skipped if ImageMagick can't draw them)
+    print               rastering those cards for the QL printer, written to a file
+    render_mono         drawing them as 1-bit PBMs, with --mono
+    print_mono          rastering those, with no conversion needed
+
+Results are printed and written as JSON, for comparing between releases; with --baseline, each
+stage is compared against an earlier results file, and the run fails if any stage has slowed
+down by more than --tolerance.
+
+Run from anywhere: python3 benchmarks/run_benchmarks.py [options]; see -h. Every stage goes
+through adif_to_qsl, which imports Wand, so ImageMagick has to be installed.
+
+"""
+
+
+import argparse
+import contextlib
+from datetime import datetime
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import adif_to_qsl
+except ImportError as error:
+    sys.exit(f"run_benchmarks.py needs adif_to_qsl's requirements, ImageMagick included: {error}")
+import imb
+import ql_printer
+import qsl_config
+from bench_ingest import make_dump
+
+
+def make_log(path, qsos, licenses):
+    """make_log(path, qsos, licenses):
+
+    Write an ADIF log of qsos QSOs to path, with callsigns from a make_dump() dump of licenses
+    licenses, and one QSO in fifty with a callsign that isn't in it.
+
+    Returns: nothing.
+
+    """
+    rng = random.Random(1)
+    bands = [('20m', '14.074', 'FT8'), ('40m', '7.074', 'FT8'), ('20m', '14.062', 'CW'),
+        ('80m', '3.573', 'FT4'), ('10m', '28.074', 'FT8')]
+    with open(path, 'w', encoding='utf-8') as log:
+        log.write("Generated by run_benchmarks.py\n<ADIF_VER:5>3.1.0\n<EOH>\n")
+        for i in range(qsos):
+            if rng.random() < 0.02:
+                callsign = f"W9ZZ{i}"
+            else:
+                callsign = f"K{rng.randrange(licenses)}X"
+            band, freq, mode = rng.choice(bands)
+            fields = [('CALL', callsign), ('QSO_DATE', f"2022{rng.randrange(1, 13):02d}" +
+                f"{rng.randrange(1, 29):02d}"), ('TIME_ON', f"{rng.randrange(24):02d}" +
+                f"{rng.randrange(60):02d}{rng.randrange(60):02d}"), ('MY_GRIDSQUARE', 'CN85'),
+                ('FREQ', freq), ('BAND', band), ('TX_PWR', '5'), ('MODE', mode),
+                ('RST_SENT', '-10'), ('RST_RCVD', '-12')]
+            if i % 3 == 0:
+                fields.append(('MY_SIG_INFO', 'K-1234'))
+            log.write(' '.join(f"<{name}:{len(value)}>{value}" for name, value in fields))
+            log.write(" <EOR>\n")
+
+def timed(results, stage, items, function):
+    """timed(results, stage, items, function):
+
+    Call function(), with its output hidden, and add how long it took to results under stage.
+
+    Returns: whatever function() returned.
+
+    """
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        value = function()
+    elapsed = time.perf_counter() - started
+    results[stage] = {'seconds': round(elapsed, 6), 'items': items,
+        'per_second': round(items / elapsed, 1) if elapsed else None}
+    print(f"  {stage:18} {items:8d} items {elapsed:9.3f}s " +
+        f"{items / max(elapsed, 1e-9):12.1f}/sec")
+    return value
+
+def render_stage(results, stage, sample, mono):
+    """render_stage(results, stage, sample, mono):
+
+    Time drawing the QSOs in sample as cards for the printer, as raw grayscale or, if mono is
+    set, as 1-bit PBMs. If ImageMagick is there but can't draw the cards (a missing font or
+    delegate, say), the stage is skipped.
+
+    Returns: a list of the cards, or of blank ones if the stage was skipped, so that printing
+    them can still be timed.
+
+    """
+    image_format = 'pbm' if mono else 'gray'
+    try:
+        return timed(results, stage, len(sample),
+            lambda: [adif_to_qsl.render_card(q_p, True, image_format, mono) for q_p in sample])
+    except Exception as error:
+        results[stage] = {'skipped': f"{type(error).__name__}: {error}"}
+        print(f"  {stage:18} skipped: {results[stage]['skipped']}")
+        width, height = adif_to_qsl.CARD_HEIGHT, adif_to_qsl.CARD_WIDTH
+        if mono:
+            blank = b'P4\n%d %d\n' % (width, height) + bytes((width + 7) // 8 * height)
+        else:
+            blank = b'\xff' * (width * height)
+        return [blank] * len(sample)
+
+def print_stage(results, stage, cards, batch, mono):
+    """print_stage(results, stage, cards, batch, mono):
+
+    Time rastering cards from render_stage() for the QL printer, batch labels to a job, into
+    printer.bin.
+
+    Returns: nothing.
+
+    """
+    printer = ql_printer.QLPrinter(model=qsl_config.PRINTER_MODEL, label=qsl_config.LABEL_SIZE,
+        output_file='printer.bin')
+    def print_cards():
+        for card in cards:
+            if mono:
+                size, raster = ql_printer.read_pbm(card)
+                printer.queue_card(raster, size, bilevel=True)
+            else:
+                printer.queue_card(card, (adif_to_qsl.CARD_HEIGHT, adif_to_qsl.CARD_WIDTH))
+            if len(printer.queued) >= batch:
+                printer.flush()
+        printer.flush()
+    timed(results, stage, len(cards), print_cards)
+    printer.close()
+    results[stage]['bytes'] = os.path.getsize('printer.bin')
+
+def run(args, workdir):
+    """run(args, workdir):
+
+    Generate the fixtures in workdir and time every stage there.
+
+    Returns: a dict of stage name to its results, as added by timed(), or to a dict with a
+    'skipped' reason.
+
+    """
+    os.chdir(workdir)
+    results = {}
+    print(f"Generating {args.licenses} licenses and {args.qsos} QSOs in {workdir}")
+    make_dump(workdir, args.licenses)
+    make_log('log.adi', args.qsos, args.licenses)
+
+    timed(results, 'parse_db_columnar', args.licenses,
+        lambda: adif_to_qsl.parse_db(engine='columnar'))
+    os.remove('uls.db')
+    timed(results, 'parse_db', args.licenses, lambda: adif_to_qsl.parse_db(engine='rows'))
+
+    with open('log.adi', encoding='utf-8') as log:
+        qsos = timed(results, 'adif_parse', args.qsos, lambda: list(adif_to_qsl.read_qsos(log)))
+    qsos = timed(results, 'lookup', len(qsos),
+        lambda: list(adif_to_qsl.lookup_addresses(qsos)))
+
+    ids = (int(qsl_config.BARCODE_ID), int(qsl_config.SERVICE_ID), int(qsl_config.MY_MAILER_ID))
+    mailable = [q_p for q_p in qsos if q_p['has_address']]
+    serials = list(range(len(mailable)))
+    zipcodes = [q_p['zip'].replace('-', '') for q_p in mailable]
+    imbcodes = timed(results, 'imb_encode', len(mailable),
+        lambda: imb.encode_many(*ids, serials, zipcodes))
+    problems = timed(results, 'imb_verify', len(mailable),
+        lambda: imb.verify_many(*ids, serials, zipcodes, imbcodes))
+    if problems:
+        raise RuntimeError(f"{len(problems)} barcodes didn't verify")
+    for q_p, serial, imbcode in zip(mailable, serials, imbcodes):
+        q_p['serial'] = f"{serial:06d}"
+        q_p['imbcode'] = imbcode
+
+    sample = qsos[:args.cards]
+    cards = render_stage(results, 'render', sample, False)
+    print_stage(results, 'print', cards, args.batch, False)
+    cards = render_stage(results, 'render_mono', sample, True)
+    print_stage(results, 'print_mono', cards, args.batch, True)
+    return results
+
+def compare(results, baseline, tolerance):
+    """compare(results, baseline, tolerance):
+
+    Compare each stage's throughput against the same stage in baseline (an earlier results
+    dict), and print the change.
+
+    Returns: a list of the stages that slowed down by more than tolerance (a fraction).
+
+    """
+    slower = []
+    print(f"Compared with {baseline['created']} ({baseline.get('git') or 'unknown version'}):")
+    for stage, result in results.items():
+        before = baseline['stages'].get(stage, {}).get('per_second')
+        after = result.get('per_second')
+        if not before or not after:
+            continue
+        change = after / before - 1
+        flag = ''
+        if change < -tolerance:
+            slower.append(stage)
+            flag = '  <-- slower'
+        print(f"  {stage:18} {change * 100:+7.1f}%{flag}")
+    return slower
+
+def git_version():
+    """Returns: the current git commit of this checkout, or None."""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True,
+            text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark each stage of adif_to_qsl.')
+    parser.add_argument('--licenses', metavar="N", type=int, default=100000,
+        help='licenses in the synthetic FCC dump (default 100000)')
+    parser.add_argument('--qsos', metavar="N", type=int, default=5000,
+        help='QSOs in the synthetic ADIF log (default 5000)')
+    parser.add_argument('--cards', metavar="N", type=int, default=100,
+        help='cards to render and print (default 100)')
+    parser.add_argument('--batch', metavar="N", type=int, default=50,
+        help='labels per print job (default 50)')
+    parser.add_argument('--output', metavar="filename", default='benchmark-results.json',
+        help='where to write the results (default benchmark-results.json)')
+    parser.add_argument('--baseline', metavar="filename",
+        help='an earlier results file to compare against')
+    parser.add_argument('--tolerance', metavar="fraction", type=float, default=0.2,
+        help='how much slower a stage can get than the baseline before the run fails ' +
+        '(default 0.2)')
+    parser.add_argument('--workdir', metavar="directory",
+        help='generate the fixtures here and keep them, instead of in a temporary directory')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+
+    cwd = os.getcwd()
+    try:
+        if args.workdir:
+            os.makedirs(args.workdir, exist_ok=True)
+            stages = run(args, os.path.abspath(args.workdir))
+        else:
+            with tempfile.TemporaryDirectory() as workdir:
+                stages = run(args, workdir)
+                # Leave the directory before it's cleaned up.
+                os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git': git_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'licenses': args.licenses, 'qsos': args.qsos, 'cards': args.cards,
+            'batch': args.batch},
+        'stages': stages,
+    }
+    with open(output, 'w', encoding='utf-8') as output_file:
+        json.dump(results, output_file, indent=4)
+    print(f"Wrote {output}")
+
+    if baseline and compare(stages, baseline, args.tolerance):
+        sys.exit(1)
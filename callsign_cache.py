@@ -0,0 +1,118 @@
+"""
+An on-disk LRU cache of formatted FCC addresses, keyed by callsign, so that printing cards from
+lots of small ADIF files doesn't keep redoing the same lookups for the regulars.
+
+The cache remembers which build of uls.db it was filled from, and empties itself when uls.db is
+rebuilt or has a delta applied.
+
+"""
+
+
+import json
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = 'qsl_cache.db'
+DEFAULT_CACHE_SIZE = 5000
+
+
+class CallsignCache:
+    """CallsignCache(path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_CACHE_SIZE):
+
+    A SQLite-backed cache of callsign to the dict from adif_to_qsl.format_address(). Only
+    callsigns that were found are cached. Once there are more than max_entries callsigns in it,
+    the least recently used ones are evicted.
+
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Filled from the lookup stage's thread when running with --pipeline.
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.con.execute("CREATE TABLE IF NOT EXISTS meta (key text PRIMARY KEY, value text)")
+        self.con.execute("CREATE TABLE IF NOT EXISTS addresses " +
+            "(callsign text PRIMARY KEY, record text, last_used integer)")
+        self.con.execute("CREATE INDEX IF NOT EXISTS addresses_last_used " +
+            "ON addresses (last_used)")
+        self.con.commit()
+
+    def check_generation(self, generation):
+        """check_generation(generation):
+
+        Compare the uls.db build the cache was filled from against generation (see
+        adif_to_qsl.uls_generation()), and empty the cache if they differ.
+
+        Returns: nothing.
+
+        """
+        row = self.con.execute("SELECT value FROM meta WHERE key = 'uls_generation'").fetchone()
+        if row is None or row[0] != generation:
+            self.con.execute("DELETE FROM addresses")
+            self.con.execute("INSERT OR REPLACE INTO meta (key, value) " +
+                "VALUES ('uls_generation', ?)", (generation,))
+            self.con.commit()
+
+    def get_many(self, callsigns):
+        """get_many(callsigns):
+
+        Look up a collection of callsigns, marking the ones found as recently used.
+
+        Returns: a dict of callsign to address dict, for just the callsigns that were cached.
+
+        """
+        found = {}
+        for callsign in callsigns:
+            row = self.con.execute("SELECT record FROM addresses WHERE callsign = ?",
+                (callsign,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                found[callsign] = json.loads(row[0])
+        now = time.time_ns()
+        self.con.executemany("UPDATE addresses SET last_used = ? WHERE callsign = ?",
+            [(now, callsign) for callsign in found])
+        self.con.commit()
+        return found
+
+    def put_many(self, addresses):
+        """put_many(addresses):
+
+        Store a dict of callsign to address dict, skipping callsigns with no address, then
+        evict the least recently used entries beyond max_entries.
+
+        Returns: nothing.
+
+        """
+        now = time.time_ns()
+        self.con.executemany("INSERT OR REPLACE INTO addresses (callsign, record, last_used) " +
+            "VALUES (?, ?, ?)", [(callsign, json.dumps(address), now)
+                for callsign, address in addresses.items() if address is not None])
+        count = self.con.execute("SELECT count(*) FROM addresses").fetchone()[0]
+        if count > self.max_entries:
+            self.con.execute("DELETE FROM addresses WHERE callsign IN " +
+                "(SELECT callsign FROM addresses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,))
+        self.con.commit()
+
+    def report(self):
+        """report():
+
+        Print how many callsigns were served from the cache this run.
+
+        Returns: nothing.
+
+        """
+        print(f"Address cache: {self.hits} hits, {self.misses} misses")
+
+    def close(self):
+        """close():
+
+        Close the underlying SQLite connection.
+
+        Returns: nothing.
+
+        """
+        self.con.close()
@@ -0,0 +1,248 @@
+"""
+A compact, read-only, memory-mapped index of callsign to FCC name and address, exported from
+uls.db, for print stations that only ever look addresses up. Opening it costs an mmap() and a
+header read, and only the pages that lookups actually touch are read into memory.
+
+The file is laid out as:
+
+    header    HEADER: magic, format version, key width, record count, hash slot count, the
+              uls.db generation (see adif_to_qsl.uls_generation()) it was exported from, and
+              the size and modification time of that uls.db
+    table     one ENTRY per record, sorted by callsign: the callsign, NUL-padded to KEY_WIDTH
+              bytes, and the record's offset into the heap and length
+    slots     an open-addressed hash table of SLOT entries: the position in the table of the
+              first entry for each callsign, by crc32 of the callsign, or EMPTY_SLOT
+    heap      one record after another: the FIELDS in UTF-8, separated by FIELD_SEPARATOR
+
+Records hold addresses already tidied up for printing by adif_to_qsl.format_address(), so a
+lookup hands back exactly what a card needs. A lookup hashes the callsign, probes the slots
+(linearly) until it finds that callsign's entry or an empty slot, comparing keys in place in the
+map, and then decodes the entry's record, and those of any others after it for the same callsign.
+The table stays sorted, so the index can also be read in callsign order.
+
+"""
+
+
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from zlib import crc32
+
+DEFAULT_INDEX_PATH = 'uls.idx'
+MAGIC = b'QSLIDX\0\0'
+VERSION = 3
+KEY_WIDTH = 16
+GENERATION_WIDTH = 64
+# The keys of the dict from adif_to_qsl.format_address(), in the order they're stored.
+FIELDS = ('firstname', 'lastname', 'address', 'city', 'state', 'zip')
+FIELD_SEPARATOR = '\x1f'
+
+HEADER = struct.Struct(f'<8sHHII{GENERATION_WIDTH}sQQ')
+ENTRY = struct.Struct(f'<{KEY_WIDTH}sII')
+# The part of an ENTRY after its key: the record's offset into the heap, and its length.
+POINTER = struct.Struct('<II')
+SLOT = struct.Struct('<I')
+EMPTY_SLOT = 0xFFFFFFFF
+
+
+def _slot_count(keys):
+    """The number of hash slots for keys distinct callsigns: a power of two, at most half full."""
+    slots = 1
+    while slots < 2 * keys:
+        slots *= 2
+    return slots
+
+def _hash_slots(table, count):
+    """_hash_slots(table, count):
+
+    Build the hash table for the count sorted entries in table.
+
+    Returns: the slots, as bytes.
+
+    """
+    firsts = [i for i in range(count) if i == 0 or
+        table[i * ENTRY.size:i * ENTRY.size + KEY_WIDTH] !=
+        table[(i - 1) * ENTRY.size:(i - 1) * ENTRY.size + KEY_WIDTH]]
+    mask = _slot_count(len(firsts)) - 1
+    slots = [EMPTY_SLOT] * (mask + 1)
+    for i in firsts:
+        slot = crc32(table[i * ENTRY.size:i * ENTRY.size + KEY_WIDTH]) & mask
+        while slots[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        slots[slot] = i
+    return struct.pack(f'<{mask + 1}I', *slots)
+
+def write_index(rows, path, generation, source=(0, 0)):
+    """write_index(rows, path, generation, source=(0, 0)):
+
+    Write an index of rows, an iterable of (callsign, firstname, lastname, address, city, state,
+    zip) tuples sorted by callsign, to path, stamped with the uls.db generation and source, the
+    (size, modification time in nanoseconds) of uls.db. The file is built alongside and moved
+    into place at the end, so a print station never sees half an index.
+
+    Returns: the number of records written.
+
+    """
+    table = bytearray()
+    previous = b''
+    with tempfile.TemporaryFile() as heap:
+        offset = 0
+        for row in rows:
+            key = row[0].encode()
+            if len(key) > KEY_WIDTH:
+                raise ValueError(f"Callsign {row[0]} is longer than {KEY_WIDTH} bytes.")
+            if key < previous:
+                raise ValueError(f"Callsigns aren't sorted: {row[0]} came after " +
+                    f"{previous.decode()}.")
+            previous = key
+            record = FIELD_SEPARATOR.join(value or '' for value in row[1:]).encode()
+            table += ENTRY.pack(key, offset, len(record))
+            heap.write(record)
+            offset += len(record)
+
+        count = len(table) // ENTRY.size
+        slots = _hash_slots(table, count)
+        partial = f"{path}.partial"
+        with open(partial, 'wb') as index:
+            index.write(HEADER.pack(MAGIC, VERSION, KEY_WIDTH, count, len(slots) // SLOT.size,
+                generation.encode()[:GENERATION_WIDTH], *source))
+            index.write(table)
+            index.write(slots)
+            heap.seek(0)
+            shutil.copyfileobj(heap, index)
+    os.replace(partial, path)
+    return count
+
+
+class CallsignIndex:
+    """CallsignIndex(path=DEFAULT_INDEX_PATH):
+
+    An open, memory-mapped index written by write_index(). generation is the uls.db generation
+    it was exported from, and source that uls.db's (size, modification time in nanoseconds).
+
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, key_width, self.count, slots, generation, *source = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or key_width != KEY_WIDTH:
+            self.close()
+            raise ValueError(f"{path} isn't a version {VERSION} callsign index.")
+        self.generation = generation.rstrip(b'\0').decode()
+        self.source = tuple(source)
+        self.mask = slots - 1
+        self.slots_start = HEADER.size + self.count * ENTRY.size
+        self.heap_start = self.slots_start + slots * SLOT.size
+
+    def find(self, callsign):
+        """find(callsign):
+
+        Look callsign up. There should only ever be one active record per callsign, but all of
+        them are returned so that the caller can complain if there are more.
+
+        Returns: a list of dicts, as from adif_to_qsl.format_address(), empty if the callsign
+        isn't in the index.
+
+        """
+        records = []
+        if self.count == 0:
+            return records
+        key = callsign.encode().ljust(KEY_WIDTH, b'\0')
+        table = self.map
+        # mmap.find() compares the key where it lies in the map, without copying it out.
+        find = table.find
+        slot = crc32(key) & self.mask
+        while True:
+            i = SLOT.unpack_from(table, self.slots_start + slot * SLOT.size)[0]
+            if i == EMPTY_SLOT:
+                return records
+            start = HEADER.size + i * ENTRY.size
+            if find(key, start, start + KEY_WIDTH) == start:
+                break
+            slot = (slot + 1) & self.mask
+        end = HEADER.size + self.count * ENTRY.size
+        while True:
+            offset, length = POINTER.unpack_from(table, start + KEY_WIDTH)
+            offset += self.heap_start
+            records.append(dict(zip(FIELDS,
+                str(table[offset:offset + length], 'utf-8').split(FIELD_SEPARATOR))))
+            start += ENTRY.size
+            if start == end or find(key, start, start + KEY_WIDTH) != start:
+                return records
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        """close():
+
+        Unmap and close the index file.
+
+        Returns: nothing.
+
+        """
+        self.map.close()
+        self.file.close()
+
+
+def run_tests():
+    """run_tests():
+
+    Write a small index, with a callsign that has two records and one of the full KEY_WIDTH,
+    read it back, and check that unsorted rows and an index of another version are refused.
+
+    Returns: nothing; raises AssertionError if a check fails.
+
+    """
+    rows = [('K1AB', 'Ann', 'Bell', '1 Elm St', 'Boston', 'MA', '02101-1234'),
+        ('K1AB', 'Ann', 'Bell', '2 Oak St', 'Boston', 'MA', '02101'),
+        ('KH6ABCDEFGHIJKLM', 'José', '', 'PO Box 9', 'Hilo', 'HI', '96720'),
+        ('W7WIL', 'Willamette', 'Valley', 'PO Box 1651', 'Salem', 'OR', '97308-1651')]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'test.idx')
+        assert write_index(rows, path, '12:2024-01-01', (1234, 5678)) == len(rows)
+        index = CallsignIndex(path)
+        assert len(index) == len(rows)
+        assert index.generation == '12:2024-01-01' and index.source == (1234, 5678)
+        for callsign in ('K1AB', 'KH6ABCDEFGHIJKLM', 'W7WIL'):
+            expected = [dict(zip(FIELDS, row[1:])) for row in rows if row[0] == callsign]
+            assert index.find(callsign) == expected, callsign
+        for callsign in ('K1A', 'K1ABC', 'N0CALL', ''):
+            assert index.find(callsign) == [], callsign
+        index.close()
+
+        # Enough callsigns that some of them collide in the hash slots.
+        many = sorted((f"N{n}X", str(n), '', '', '', '', '') for n in range(2000))
+        write_index(many, path, '')
+        index = CallsignIndex(path)
+        for row in many:
+            assert index.find(row[0]) == [dict(zip(FIELDS, row[1:]))], row[0]
+        index.close()
+
+        assert write_index([], path, '') == 0
+        index = CallsignIndex(path)
+        assert index.find('K1AB') == []
+        index.close()
+
+        try:
+            write_index(rows[::-1], path, '')
+            raise AssertionError("unsorted rows were written")
+        except ValueError:
+            pass
+        with open(path, 'r+b') as index_file:
+            index_file.seek(len(MAGIC))
+            index_file.write(struct.pack('<H', VERSION - 1))
+        try:
+            CallsignIndex(path)
+            raise AssertionError("an index of another version was opened")
+        except ValueError:
+            pass
+    print("callsign_index: all tests passed")
+
+
+if __name__ == "__main__":
+    run_tests()
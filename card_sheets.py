@@ -0,0 +1,249 @@
+"""
+Lays QSL card labels out several to a page, in a grid, on sheets of letter or A4 paper, for a
+mailing big enough that it's better printed on a laser printer and cut up than printed a label
+at a time. The sheets go into a single multi-page PDF or TIFF.
+
+Each page is written to the file as soon as it's full, so only one page is ever held in memory,
+however many cards there are.
+
+"""
+
+
+import zlib
+
+from PIL import Image, TiffImagePlugin
+
+# (width, height) in inches
+PAPER_SIZES = {'letter': (8.5, 11.0), 'a4': (8.27, 11.69)}
+DEFAULT_PAPER = 'letter'
+# Most printers can't print right up to the edge of the paper.
+DEFAULT_MARGIN = 0.5
+
+
+def grid_size(text):
+    """grid_size(text):
+
+    Parse a grid given as COLUMNSxROWS, e.g. "2x3".
+
+    Returns: a tuple of (columns, rows).
+
+    """
+    columns, rows = (int(n) for n in text.lower().split('x'))
+    if columns < 1 or rows < 1:
+        raise ValueError(text)
+    return columns, rows
+
+
+class SheetWriter:
+    """SheetWriter(path, card_size, dpi, paper=DEFAULT_PAPER, grid=None, margin=DEFAULT_MARGIN,
+    mono=False):
+
+    Write cards of card_size (width, height) pixels at dpi onto sheets of paper (a key of
+    PAPER_SIZES) in path, a PDF or TIFF by its extension. Cards are laid out grid (columns,
+    rows) to a page, centered inside a margin (in inches) all round, in whichever orientation
+    they fit; without a grid, as many as fit, turning the paper sideways if more fit that way.
+    Pages are 1-bit if mono is set, and grayscale otherwise.
+
+    """
+
+    def __init__(self, path, card_size, dpi, paper=DEFAULT_PAPER, grid=None,
+        margin=DEFAULT_MARGIN, mono=False):
+        self.card_size = card_size
+        self.mode = '1' if mono else 'L'
+        self.cards = 0
+        self.pages = 0
+        self.path = path
+        portrait = tuple(int(inches * dpi) for inches in PAPER_SIZES[paper])
+        layouts = []
+        for page_size in (portrait, portrait[::-1]):
+            fits = tuple((side - int(margin * dpi) * 2) // card
+                for side, card in zip(page_size, card_size))
+            if grid is None or (grid[0] <= fits[0] and grid[1] <= fits[1]):
+                layouts.append((grid or fits, page_size))
+        # The layout with the most cards to a page; portrait, if that's a tie.
+        layouts.sort(key=lambda layout: -layout[0][0] * layout[0][1])
+        if not layouts or layouts[0][0][0] * layouts[0][0][1] == 0:
+            fit = f"{grid[0]}x{grid[1]}" if grid else "at all"
+            raise ValueError(f"Cards don't fit {fit} to a {paper} page with {margin}\" margins.")
+        (self.columns, self.rows), self.page_size = layouts[0]
+        # Center the block of cards on the page; they butt up against each other, so one cut
+        # separates two of them.
+        self.origin = tuple((side - card * count) // 2 for side, card, count in
+            zip(self.page_size, card_size, (self.columns, self.rows)))
+        self.page = None
+        self.on_page = 0
+        extension = path.lower().rsplit('.', 1)[-1]
+        if extension == 'pdf':
+            self.output = _PdfWriter(path, dpi)
+        elif extension in ('tif', 'tiff'):
+            self.output = _TiffWriter(path, dpi)
+        else:
+            raise ValueError(f"Can only write sheets to a .pdf or .tif file, not {path}.")
+
+    def add_card(self, data, size, bilevel=False):
+        """add_card(data, size, bilevel=False):
+
+        Add one card, given as 8-bit grayscale pixels of the given (width, height), to the next
+        space on the page, or as 1-bit packed rows with 1 for black (from ql_printer.read_pbm())
+        if bilevel is set.
+
+        Returns: True if that filled the page and it was written out, or False.
+
+        """
+        if bilevel:
+            card = Image.frombytes('1', size, data, 'raw', '1;I')
+        else:
+            card = Image.frombytes('L', size, data)
+        if card.mode != self.mode:
+            card = card.convert(self.mode)
+        if self.page is None:
+            self.page = Image.new(self.mode, self.page_size, 255)
+        row, column = divmod(self.on_page, self.columns)
+        self.page.paste(card, (self.origin[0] + column * self.card_size[0],
+            self.origin[1] + row * self.card_size[1]))
+        self.on_page += 1
+        self.cards += 1
+        if self.on_page == self.columns * self.rows:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        """flush():
+
+        Write out the page in progress, if there is one, even if it isn't full.
+
+        Returns: nothing.
+
+        """
+        if self.page is not None:
+            self.output.add_page(self.page)
+            self.pages += 1
+            self.page = None
+            self.on_page = 0
+
+    def close(self):
+        """close():
+
+        Write out the last page and finish the file.
+
+        Returns: nothing.
+
+        """
+        self.flush()
+        self.output.close()
+        print(f"Laid {self.cards} cards out on {self.pages} pages ({self.columns}x{self.rows} " +
+            f"to a page) in {self.path}")
+
+
+class _PdfWriter:
+    """_PdfWriter(path, dpi):
+
+    A bare-bones PDF writer that adds each page (one image, covering it) to the file as it goes,
+    and writes the page tree and cross-reference table at the end.
+
+    """
+
+    # Objects 1 and 2, the catalog and the page tree, are written last.
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, path, dpi):
+        self.file = open(path, 'wb')
+        self.dpi = dpi
+        self.offsets = {}
+        self.kids = []
+        self.next_number = 3
+        # The comment of high bytes tells file transfer tools it's binary.
+        self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write_object(self, body, stream=None, number=None):
+        """Write one object (and its stream, if it has one), returning its number."""
+        if number is None:
+            number = self.next_number
+            self.next_number += 1
+        self.offsets[number] = self.file.tell()
+        self.file.write(b'%d 0 obj\n' % number + body)
+        if stream is not None:
+            self.file.write(b'\nstream\n' + stream + b'\nendstream')
+        self.file.write(b'\nendobj\n')
+        return number
+
+    def add_page(self, image):
+        """add_page(image):
+
+        Add a page of the image's size, at dpi. The image is 8-bit or 1-bit gray: in both, PIL
+        and PDF agree on rows padded to a whole byte, and on the highest value being white.
+
+        Returns: nothing.
+
+        """
+        width, height = image.size
+        pixels = zlib.compress(image.tobytes())
+        xobject = self._write_object(b'<< /Type /XObject /Subtype /Image /Width %d /Height %d ' %
+            (width, height) + b'/ColorSpace /DeviceGray /BitsPerComponent %d ' %
+            (1 if image.mode == '1' else 8) + b'/Filter /FlateDecode /Length %d >>' % len(pixels),
+            pixels)
+        points = (width * 72 / self.dpi, height * 72 / self.dpi)
+        drawing = b'q %.2f 0 0 %.2f 0 0 cm /Sheet Do Q' % points
+        contents = self._write_object(b'<< /Length %d >>' % len(drawing), drawing)
+        self.kids.append(self._write_object(b'<< /Type /Page /Parent %d 0 R ' % self.PAGES +
+            b'/MediaBox [0 0 %.2f %.2f] ' % points +
+            b'/Resources << /XObject << /Sheet %d 0 R >> >> /Contents %d 0 R >>' %
+            (xobject, contents)))
+        self.file.flush()
+
+    def close(self):
+        """close():
+
+        Write the page tree, catalog, cross-reference table and trailer, and close the file.
+
+        Returns: nothing.
+
+        """
+        self._write_object(b'<< /Type /Pages /Kids [' +
+            b' '.join(b'%d 0 R' % kid for kid in self.kids) +
+            b'] /Count %d >>' % len(self.kids), number=self.PAGES)
+        self._write_object(b'<< /Type /Catalog /Pages %d 0 R >>' % self.PAGES,
+            number=self.CATALOG)
+        xref = self.file.tell()
+        self.file.write(b'xref\n0 %d\n0000000000 65535 f \n' % self.next_number)
+        for number in range(1, self.next_number):
+            self.file.write(b'%010d 00000 n \n' % self.offsets[number])
+        self.file.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' %
+            (self.next_number, self.CATALOG, xref))
+        self.file.close()
+
+
+class _TiffWriter:
+    """_TiffWriter(path, dpi):
+
+    Add each page to a multi-page TIFF as it goes, with Pillow. 1-bit pages are compressed as
+    fax (CCITT Group 4), which is what most things expect of a black and white TIFF.
+
+    """
+
+    def __init__(self, path, dpi):
+        self.tiff = TiffImagePlugin.AppendingTiffWriter(path, new=True)
+        self.dpi = dpi
+
+    def add_page(self, image):
+        """add_page(image):
+
+        Add a page of the image, at dpi.
+
+        Returns: nothing.
+
+        """
+        compression = 'group4' if image.mode == '1' else 'tiff_adobe_deflate'
+        image.save(self.tiff, format='TIFF', compression=compression, dpi=(self.dpi, self.dpi))
+        self.tiff.newFrame()
+
+    def close(self):
+        """close():
+
+        Finish the file and close it.
+
+        Returns: nothing.
+
+        """
+        self.tiff.close()
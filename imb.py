@@ -25,10 +25,14 @@
 
 # https://ribbs.usps.gov/intelligentmail_mailpieces/documents/tech_guides/SPUSPSG.pdf
 
+import os
 import sys
 
 W = sys.stderr.write
 
+TABLE_NAMES = ('TAB5', 'TAB2', 'TABLE_A', 'TABLE_D', 'CRC_FIRST', 'CRC_TABLE')
+TABLES_PATH = os.path.join (os.path.dirname (os.path.abspath (__file__)), 'imb_tables.py')
+
 # Note: this could probably be written much more simply...
 def crc11 (input_item):
     gen_poly = 0x0f35
@@ -55,6 +59,41 @@ def crc11 (input_item):
             data <<= 1
     return FCS
 
+def make_crc_tables():
+    "tables for crc11_fast(): the first byte (6 bits) starting from 0x7ff, and a byte at a time."
+    gen_poly = 0x0f35
+    first = []
+    for byte in range (64):
+        FCS = 0x07ff
+        data = byte << 5
+        for bit in range (2, 8):
+            if (FCS ^ data) & 0x400:
+                FCS = (FCS << 1) ^ gen_poly
+            else:
+                FCS = FCS << 1
+            FCS &= 0x7ff
+            data <<= 1
+        first.append (FCS)
+    table = []
+    for byte in range (256):
+        FCS = byte << 3
+        for bit in range (8):
+            if FCS & 0x400:
+                FCS = (FCS << 1) ^ gen_poly
+            else:
+                FCS = FCS << 1
+            FCS &= 0x7ff
+        table.append (FCS)
+    return first, table
+
+def crc11_fast (n):
+    "crc11() of the 13-byte big-endian form of n, a byte at a time from lookup tables."
+    data = n.to_bytes (13, 'big')
+    FCS = crc_first[data[0] & 0x3f]
+    for byte in data[1:]:
+        FCS = ((FCS << 8) & 0x7ff) ^ crc_table[(FCS >> 3) ^ byte]
+    return FCS
+
 def reverse_int16 (input_item):
     reverse = 0
     for i in range (16):
@@ -97,11 +136,11 @@ def init_n_of_13 (n, table_length):
 def make_inverted_tabs():
     global inverted
     inverted = {}
-    for k, v in tab5.items():
+    for k, v in enumerate (tab5):
         if v in inverted:
             raise ValueError
         inverted[v] = (0, k)
-    for k, v in tab2.items():
+    for k, v in enumerate (tab2):
         if v in inverted:
             raise ValueError
         inverted[v] = (1, k)
@@ -175,40 +214,50 @@ def to_bytes (val, nbytes):
     return r
 
 def encode (barcode_id, service_type_id, mailer_id, serial, delivery):
-    n = convert_routing_code (delivery)
+    return encode_many (barcode_id, service_type_id, mailer_id, [serial], [delivery])[0]
+
+def encode_many (barcode_id, service_type_id, mailer_id, serials, deliveries):
+    "encode one barcode per (serial, delivery) pair, all with the same ids; see encode()."
     if str(mailer_id)[0] == '9':
-        tracking = '%02d%03d%09d%06d' % (
-            barcode_id,
-            service_type_id,
-            mailer_id,
-            serial
-            )
+        serial_digits = 6
     else:
-        tracking = '%02d%03d%06d%09d' % (
-            barcode_id,
-            service_type_id,
-            mailer_id,
-            serial
-            )
-    n = convert_tracking_code (n, tracking)
-    # convert to bytes for byte-based crc11 fun
-    fcs = crc11 (to_bytes (n, 13))
-    codewords = binary_to_codewords (n)
-    codewords[9] *= 2
-    if fcs & (1<<10):
-        codewords[0] += 659
+        serial_digits = 9
+    prefix = '%02d%03d%0*d' % (barcode_id, service_type_id, 15 - serial_digits, mailer_id)
+    # the tracking code is two digits (the second one base 5) followed by 18 base-10 digits,
+    # so everything but the routing code and serial can be worked out once up front.
+    # see convert_tracking_code().
+    head = int (prefix[0]) * 5 + int (prefix[1])
+    rest = int (prefix[2:]) * 10 ** serial_digits
+    serial_limit = 10 ** serial_digits
     r = []
-    for b in codewords:
-        if b < 1287:
-            r.append (tab5[b])
-        elif 127 <= b <= 1364:
-            r.append (tab2[b-1287])
-        else:
-            raise ValueError
-    for i in range (10):
-        if fcs & 1<<i:
-            r[i] = r[i] ^ 0x1fff
-    return make_bars (r)
+    for serial, delivery in zip (serials, deliveries):
+        if not 0 <= serial < serial_limit:
+            raise ValueError (serial)
+        n = (convert_routing_code (delivery) * 50 + head) * 10 ** 18 + rest + serial
+        fcs = crc11_fast (n)
+        n, last = divmod (n, 636)
+        codewords = [0] * 10
+        for i in range (8, -1, -1):
+            n, codewords[i] = divmod (n, 1365)
+        codewords[9] = last * 2
+        if fcs & (1<<10):
+            codewords[0] += 659
+        code = []
+        for b in codewords:
+            if b < 1287:
+                code.append (tab5[b])
+            elif b <= 1364:
+                code.append (tab2[b-1287])
+            else:
+                raise ValueError
+        for i in range (10):
+            if fcs & 1<<i:
+                code[i] = code[i] ^ 0x1fff
+        r.append (''.join ([
+            'TADF'[(code[d] & d_mask != 0) << 1 | (code[a] & a_mask != 0)]
+            for a, a_mask, d, d_mask in bar_masks
+            ]))
+    return r
 
 # the bits from the table seem scattered, there's probably some
 #   logic behind the table that I haven't grokked yet...
@@ -240,29 +289,63 @@ def unbar (code):
             pass
     return r
 
-def decode (codes):
+def decode_fields (codes):
+    "decode a barcode into its parts, without printing; raises ValueError if it's not valid."
+    if len (codes) != 65:
+        raise ValueError ('a barcode has 65 bars', len (codes))
+    code = [0] * 10
+    for ch, (a, a_mask, d, d_mask) in zip (codes, bar_masks):
+        if ch == 'A' or ch == 'F':
+            code[a] |= a_mask
+        if ch == 'D' or ch == 'F':
+            code[d] |= d_mask
     fcs = 0
-    codes = unbar (codes)
     r = []
     for i in range (10):
-        code = codes[i]
-        if not inverted.has_key (code):
-            code = code ^ 0x1fff
+        c = code[i]
+        if c not in inverted:
+            c = c ^ 0x1fff
             fcs |= 1<<i
-        bump, val = inverted[code]
+            if c not in inverted:
+                raise ValueError ('not a valid character', i)
+        bump, val = inverted[c]
         if bump:
             val += 1287
         r.append (val)
-    if r[0] > 659:
+    if r[0] > 658:
         fcs |= 1<<10
         r[0] -= 659
     r[9] >>= 1
     binary = codewords_to_binary (r)
-    fcs0 = crc11 (to_bytes (binary, 13))
-    decimal = '%020d' % (int (binary),)
     a, tracking = unconvert_tracking_code (binary)
-    routing = unconvert_routing_code (a)
-    routing = '%d' % (routing,)
+    # keep any leading zeros, which unconvert_routing_code() loses
+    if a > 1000100000:
+        routing = '%011d' % (a - 1000100001,)
+    elif a > 100000:
+        routing = '%09d' % (a - 100001,)
+    elif a:
+        routing = '%05d' % (a - 1,)
+    else:
+        routing = ''
+    if tracking[5] == '9':
+        mailer_id = tracking[5:5+9]
+        serial = tracking[5+9:5+9+6]
+    else:
+        mailer_id = tracking[5:5+6]
+        serial = tracking[5+6:5+6+9]
+    return {
+        'routing': routing,
+        'tracking': tracking,
+        'barcode_id': tracking[0:2],
+        'service_type': tracking[2:5],
+        'mailer_id': mailer_id,
+        'serial': serial,
+        'crc_ok': fcs == crc11_fast (binary),
+        }
+
+def decode (codes):
+    fields = decode_fields (codes)
+    routing = fields['routing']
     print('routing', routing)
     if len(routing) == 11:
         print('zip %s-%s delivery point %s' % (routing[:5], routing[5:9], routing[9:]))
@@ -272,19 +355,36 @@ def decode (codes):
         print('zip %s' % (routing[:5],))
     else:
         print('zip: empty')
-    print('tracking', tracking)
-    barcode_id = tracking[0:2]
-    service_type = tracking[2:5]
-    if tracking[5] == '9':
-        mailer_id = tracking[5:5+9]
-        serial = tracking[5+9:5+9+6]
-    else:
-        mailer_id = tracking[5:5+6]
-        serial = tracking[5+6:5+6+9]
-    print('barcode_id', barcode_id)
-    print('service_type', service_type)
-    print('mailer_id', mailer_id)
-    print('serial', serial)
+    print('tracking', fields['tracking'])
+    print('barcode_id', fields['barcode_id'])
+    print('service_type', fields['service_type'])
+    print('mailer_id', fields['mailer_id'])
+    print('serial', fields['serial'])
+    if not fields['crc_ok']:
+        print('CRC MISMATCH')
+
+def verify_many (barcode_id, service_type_id, mailer_id, serials, deliveries, codes):
+    "decode each barcode and check it against its inputs; returns a list of (index, problem)."
+    problems = []
+    for i, (serial, delivery, code) in enumerate (zip (serials, deliveries, codes)):
+        try:
+            fields = decode_fields (code)
+        except (ValueError, KeyError) as e:
+            problems.append ((i, 'does not decode: %r' % (e,)))
+            continue
+        if not fields['crc_ok']:
+            problems.append ((i, 'bad CRC'))
+        if fields['routing'] != delivery:
+            problems.append ((i, 'routing %r, expected %r' % (fields['routing'], delivery)))
+        if int (fields['serial']) != serial:
+            problems.append ((i, 'serial %s, expected %d' % (fields['serial'], serial)))
+        if (int (fields['barcode_id']) != barcode_id
+            or int (fields['service_type']) != service_type_id
+            or int (fields['mailer_id']) != mailer_id):
+            problems.append ((i, 'ids %s/%s/%s, expected %d/%d/%d' % (
+                fields['barcode_id'], fields['service_type'], fields['mailer_id'],
+                barcode_id, service_type_id, mailer_id)))
+    return problems
 
 def render_ascii (code):
     "render the letter sequence into something resembling the actual bar code"
@@ -322,7 +422,6 @@ def render_html (code):
 
 def process_bar_table():
     "convert the bar table from the spec into something more usable."
-    global tableA, tableD
     tableA = {}
     tableD = {}
     for i in range (65):
@@ -334,6 +433,80 @@ def process_bar_table():
         a = int(a)
         tableD[i] = i0, d
         tableA[i] = i1, a
+    return tableA, tableD
+
+def generate_tables():
+    "build every lookup table from scratch, the slow way."
+    tableA, tableD = process_bar_table()
+    return {
+        'TAB5': [init_n_of_13 (5, 1287)[i] for i in range (1287)],
+        'TAB2': [init_n_of_13 (2, 78)[i] for i in range (78)],
+        'TABLE_A': [tableA[i][0] for i in range (65)] + [tableA[i][1] for i in range (65)],
+        'TABLE_D': [tableD[i][0] for i in range (65)] + [tableD[i][1] for i in range (65)],
+        'CRC_FIRST': make_crc_tables()[0],
+        'CRC_TABLE': make_crc_tables()[1],
+        }
+
+def write_tables (path=TABLES_PATH):
+    "regenerate imb_tables.py, the precomputed copy of the tables that's loaded on import."
+    tables = generate_tables()
+    lines = [
+        '# Generated by imb.write_tables() (python imb.py -g); do not edit.',
+        '# Precomputed n-of-13 and bar tables, so that importing imb doesn\'t have to build them.',
+        '# CRC_FIRST and CRC_TABLE drive crc11_fast().',
+        '# Plain tuples of ints are stored as constants in the compiled .pyc, so they load',
+        '# without any code running at all.',
+        '# TABLE_A and TABLE_D hold the 65 codeword indexes followed by the 65 bit numbers.',
+        '',
+        ]
+    for name in TABLE_NAMES:
+        values = tables[name]
+        lines.append ('%s = (' % (name,))
+        for i in range (0, len (values), 12):
+            lines.append ('    ' + ', '.join (str (v) for v in values[i:i+12]) + ',')
+        lines.append ('    )')
+    with open (path, 'w', encoding='ascii') as f:
+        f.write ('\n'.join (lines) + '\n')
+
+def check_tables():
+    "regenerate the tables and make sure the precomputed ones loaded on import match."
+    import imb_tables
+    tables = generate_tables()
+    for name, values in tables.items():
+        if list (getattr (imb_tables, name)) != values:
+            raise ValueError ('imb_tables.%s is out of date; regenerate it with imb.py -g'
+                % (name,))
+    # and that the table-driven crc matches the bit-by-bit one
+    for n in (0, 1, 0x3ff, (1 << 102) - 1, 12345678901234567890123456789):
+        if crc11_fast (n) != crc11 (to_bytes (n, 13)):
+            raise ValueError ('crc11_fast does not match crc11', n)
+    # and that the tables actually in use came from them
+    if list (tab5) != tables['TAB5'] or list (tab2) != tables['TAB2']:
+        raise ValueError ('n-of-13 tables in use do not match')
+    for i in range (65):
+        if tableA[i] != (tables['TABLE_A'][i], tables['TABLE_A'][65+i]):
+            raise ValueError ('tableA in use does not match', i)
+        if tableD[i] != (tables['TABLE_D'][i], tables['TABLE_D'][65+i]):
+            raise ValueError ('tableD in use does not match', i)
+
+def load_tables():
+    "load the precomputed tables, falling back to building them if imb_tables.py is missing."
+    global tableA, tableD, tab5, tab2, crc_first, crc_table, bar_masks
+    try:
+        import imb_tables
+        tables = dict ((name, getattr (imb_tables, name)) for name in TABLE_NAMES)
+    except (ImportError, AttributeError):
+        tables = generate_tables()
+    tab5 = tables['TAB5']
+    tab2 = tables['TAB2']
+    tableA = list (zip (tables['TABLE_A'][:65], tables['TABLE_A'][65:]))
+    tableD = list (zip (tables['TABLE_D'][:65], tables['TABLE_D'][65:]))
+    crc_first = tables['CRC_FIRST']
+    crc_table = tables['CRC_TABLE']
+    # (ascender codeword, bit mask, descender codeword, bit mask) for each bar, for encode_many()
+    bar_masks = [(tableA[i][0], 1 << tableA[i][1], tableD[i][0], 1 << tableD[i][1])
+                 for i in range (65)]
+    make_inverted_tabs()
 
 # last table from the spec, can this be generated?
 bar_table = [
@@ -370,6 +543,7 @@ def t1():
     return encode (0, 700, 314159, 1, '95008200130')
 
 def run_tests():
+    check_tables()
     code = t0()
     print(code)
     code = t1()
@@ -378,15 +552,15 @@ def run_tests():
         render_ascii (sample)
         decode (sample)
 
-process_bar_table()
-tab5 = init_n_of_13 (5, 1287)
-tab2 = init_n_of_13 (2, 78)
-make_inverted_tabs()
+load_tables()
 
 if __name__ == '__main__':
     if '-t' in sys.argv:
         sys.argv.remove ('-t')
         run_tests()
+    elif '-g' in sys.argv:
+        sys.argv.remove ('-g')
+        write_tables()
     elif '-d' in sys.argv:
         sys.argv.remove ('-d')
         code = sys.argv[1]
@@ -408,6 +582,7 @@ if __name__ == '__main__':
         sys.stderr.write (
             "Usage: %s\n"
             "    -t : run tests\n"
+            "    -g : regenerate the precomputed tables in imb_tables.py\n"
             "    -d AAFDTDFDT... : decode\n"
             "    -e barcode-id service-type mailer-id serial delivery : encode to ASCII\n"
             "    -h barcode-id service-type mailer-id serial delivery : encode to HTML\n"
@@ -0,0 +1,226 @@
+"""
+A journal of every label in a mailing, and how far it's got (parsed, rendered, printed), kept up
+to date as the run goes, so that a run that dies partway (a printer jam at label 312 of 500, say)
+can be picked up again with --resume rather than started over.
+
+Resuming skips the labels that were printed, and gives the rest the serial numbers and barcodes
+they were issued the first time around, so that no serials are wasted.
+
+"""
+
+
+import contextlib
+from datetime import datetime
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+import timings
+
+DEFAULT_JOURNAL_PATH = 'mailing_journal.db'
+STATUSES = ('parsed', 'rendered', 'printed')
+
+
+def label_key(q_p):
+    """label_key(q_p):
+
+    Identify a label by its (first) QSO: callsign, date, time, frequency and mode, plus how many
+    QSOs are on it, for grouped cards.
+
+    Returns: a string.
+
+    """
+    return '|'.join([q_p['callsign'] or '', q_p['date'], q_p['time'], q_p['frequency'] or '',
+        q_p['mode'] or '', str(len(q_p.get('qsos', [q_p])))])
+
+
+class MailingJournal:
+    """MailingJournal(mailing, path=DEFAULT_JOURNAL_PATH, resume=False):
+
+    The journal for one mailing (the ADIF file it came from, by absolute path). Unless resume
+    is set, anything journaled for that mailing before is forgotten, and the run starts over.
+
+    Each QSO (or grouped card) is tagged with its 'label' as it passes through restore(), and
+    is marked parsed by track() (a chunk at a time, as soon as they have their barcodes), then
+    rendered and printed by mark().
+
+    """
+
+    def __init__(self, mailing, path=DEFAULT_JOURNAL_PATH, resume=False):
+        self.mailing = mailing
+        self.resume = resume
+        self.skipped = 0
+        self.seen = {}
+        # With --pipeline, labels are tracked from the barcode stage's thread and marked from the
+        # printing one, so the connection is shared, one method at a time.
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        # Commit every status change, but let WAL save us an fsync() for each one.
+        self.con.execute("PRAGMA journal_mode = WAL")
+        self.con.execute("PRAGMA synchronous = NORMAL")
+        self.con.execute("CREATE TABLE IF NOT EXISTS labels " +
+            "(mailing text, label text, position integer, status text, record text, " +
+            "updated_at text, PRIMARY KEY (mailing, label))")
+        if not resume:
+            self.con.execute("DELETE FROM labels WHERE mailing = ?", (mailing,))
+        self.con.commit()
+
+    def restore(self, qsos):
+        """restore(qsos):
+
+        Tag each QSO with its label. Duplicate QSOs in a log are told apart by how many times
+        they've been seen. When resuming, labels that were printed are dropped, and the others
+        get back the serial and barcode that were journaled for them.
+
+        Returns: a generator of the QSOs still to be printed, in the order they came in.
+
+        """
+        for q_p in qsos:
+            key = label_key(q_p)
+            self.seen[key] = self.seen.get(key, 0) + 1
+            q_p['label'] = f"{key}|{self.seen[key]}"
+            if self.resume:
+                with self.lock:
+                    row = self.con.execute("SELECT status, record FROM labels " +
+                        "WHERE mailing = ? AND label = ?",
+                        (self.mailing, q_p['label'])).fetchone()
+                if row and row[0] == 'printed':
+                    self.skipped += 1
+                    continue
+                if row:
+                    journaled = json.loads(row[1])
+                    if 'imbcode' in journaled:
+                        q_p['serial'] = journaled['serial']
+                        q_p['imbcode'] = journaled['imbcode']
+            yield q_p
+        if self.skipped:
+            print(f"Skipped {self.skipped} labels that were already printed")
+
+    def track(self, qsos):
+        """track(qsos):
+
+        Journal a list of QSOs, with their serials and barcodes, as parsed, in one transaction.
+
+        Returns: the same list.
+
+        """
+        with self.lock, timings.timed('journal'):
+            position = self.con.execute("SELECT coalesce(max(position), 0) FROM labels " +
+                "WHERE mailing = ?", (self.mailing,)).fetchone()[0]
+            rows = []
+            for q_p in qsos:
+                row = self.con.execute("SELECT position FROM labels " +
+                    "WHERE mailing = ? AND label = ?", (self.mailing, q_p['label'])).fetchone()
+                if row is None:
+                    position += 1
+                rows.append((self.mailing, q_p['label'], position if row is None else row[0],
+                    json.dumps(q_p), _now()))
+            self.con.executemany("INSERT OR REPLACE INTO labels " +
+                "(mailing, label, position, status, record, updated_at) " +
+                "VALUES (?, ?, ?, 'parsed', ?, ?)", rows)
+            self.con.commit()
+        return qsos
+
+    def mark(self, qsos, status):
+        """mark(qsos, status):
+
+        Move a list of QSOs on to status, 'rendered' or 'printed'.
+
+        Returns: nothing.
+
+        """
+        with self.lock, timings.timed('journal'):
+            self.con.executemany("UPDATE labels SET status = ?, updated_at = ? " +
+                "WHERE mailing = ? AND label = ?",
+                [(status, _now(), self.mailing, q_p['label']) for q_p in qsos])
+            self.con.commit()
+
+    def report(self):
+        """report():
+
+        Print how many labels in the mailing are at each status.
+
+        Returns: nothing.
+
+        """
+        counts = dict(self.con.execute("SELECT status, count(*) FROM labels " +
+            "WHERE mailing = ? GROUP BY status", (self.mailing,)).fetchall())
+        print("Mailing journal: " +
+            ", ".join(f"{counts.get(status, 0)} {status}" for status in STATUSES))
+
+    def close(self):
+        """close():
+
+        Close the underlying SQLite connection.
+
+        Returns: nothing.
+
+        """
+        self.con.close()
+
+
+def _now():
+    """Returns: the current local time, ISO 8601, to the second."""
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def run_tests():
+    """run_tests():
+
+    Run a mailing of six labels (two of them for the same QSO) that jams after two have been
+    printed, then resume it, and check that only the other four come back, with the serials and
+    barcodes they were given the first time; then check that without resume, it starts over.
+
+    Returns: nothing; raises AssertionError if a check fails.
+
+    """
+    def log():
+        qsos = [{'callsign': f"K{n}AB", 'date': '2022-10-10', 'time': '12:00:00Z',
+            'frequency': '14.074', 'mode': 'FT8'} for n in range(5)]
+        return qsos + [dict(qsos[0])]
+
+    with tempfile.TemporaryDirectory() as directory, \
+        contextlib.redirect_stdout(io.StringIO()):
+        path = os.path.join(directory, 'journal.db')
+        journal = MailingJournal('/logs/test.adi', path)
+        qsos = list(journal.restore(log()))
+        for n, q_p in enumerate(qsos):
+            q_p['serial'], q_p['imbcode'] = f"{n:06d}", f"BARCODE{n}"
+        journal.track(qsos)
+        barcodes = {q_p['label']: (q_p['serial'], q_p['imbcode']) for q_p in qsos}
+        try:
+            for n, q_p in enumerate(qsos):
+                journal.mark([q_p], 'rendered')
+                if n == 2:
+                    raise RuntimeError("printer jammed")
+                journal.mark([q_p], 'printed')
+        except RuntimeError:
+            pass
+        # The run dies here, without closing the journal.
+
+        journal = MailingJournal('/logs/test.adi', path, resume=True)
+        resumed = list(journal.restore(log()))
+        assert journal.skipped == 2
+        assert [q_p['label'] for q_p in resumed] == [q_p['label'] for q_p in qsos[2:]]
+        for q_p in resumed:
+            assert (q_p['serial'], q_p['imbcode']) == barcodes[q_p['label']], q_p['label']
+        journal.track(resumed)
+        journal.mark(resumed, 'printed')
+        counts = dict(journal.con.execute("SELECT status, count(*) FROM labels " +
+            "GROUP BY status").fetchall())
+        assert counts == {'printed': 6}, counts
+        journal.close()
+
+        journal = MailingJournal('/logs/test.adi', path)
+        again = list(journal.restore(log()))
+        assert len(again) == 6 and not any('imbcode' in q_p for q_p in again)
+        assert journal.con.execute("SELECT count(*) FROM labels").fetchone()[0] == 0
+        journal.close()
+    print("mailing_journal: all tests passed")
+
+
+if __name__ == "__main__":
+    run_tests()
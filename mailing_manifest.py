@@ -0,0 +1,261 @@
+"""
+The manifest of a mailing: every label printed (or saved as an image), one JSON record a line,
+appended and flushed as each batch of labels is done, so a run that dies partway still leaves
+a manifest of everything that went out before it did. A manifest ending in .gz is gzipped,
+flushed the same way. Each record says where the run's labels went, as its 'output': one of
+OUTPUTS.
+
+Each record's callsigns, serial and output are also filed in a small SQLite index, alongside
+where in which manifest the record is, so that "did we mail W7WIL?" is answered by reading just
+the matching lines, rather than every manifest there's ever been.
+
+"""
+
+
+import contextlib
+from datetime import datetime
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+
+import timings
+
+DEFAULT_INDEX_PATH = 'manifest_index.db'
+# Where a run's labels can go: the printer, a --print_to_file file, -i images or --sheets.
+OUTPUTS = ('printer', 'file', 'images', 'sheets')
+# The outputs that are actually mailed; the others are only for trying things out.
+MAILED_OUTPUTS = ('printer', 'sheets')
+
+
+def manifest_path(compress=False):
+    """manifest_path(compress=False):
+
+    Returns: a new manifest's filename, mailing-<date and time>.jsonl (or .jsonl.gz).
+
+    """
+    return f"mailing-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.jsonl" + \
+        (".gz" if compress else "")
+
+def _open(path, mode):
+    """Open a manifest, gzipped or not by its name, in binary mode."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+def _create(path):
+    """_create(path):
+
+    Create a new manifest at path, or, if another run already has one there (two runs in the
+    same second, say), at path with -2, -3 and so on before its extension.
+
+    Returns: a tuple of (the path it was created at, the manifest, open for writing).
+
+    """
+    if path.endswith('.gz'):
+        root, extension = os.path.splitext(path[:-len('.gz')])
+        extension += '.gz'
+    else:
+        root, extension = os.path.splitext(path)
+    attempt = 1
+    while True:
+        try:
+            return path, _open(path, 'xb')
+        except FileExistsError:
+            attempt += 1
+            path = f"{root}-{attempt}{extension}"
+
+def _connect(index_path):
+    """Open the manifest index, creating it if need be."""
+    con = sqlite3.connect(index_path)
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = NORMAL")
+    con.execute("CREATE TABLE IF NOT EXISTS mailed " +
+        "(callsign text, serial text, manifest text, offset integer, output text)")
+    if 'output' not in [row[1] for row in con.execute("PRAGMA table_info(mailed)")]:
+        # An index from before outputs were recorded; its labels' outputs stay NULL.
+        con.execute("ALTER TABLE mailed ADD COLUMN output text")
+    con.execute("CREATE INDEX IF NOT EXISTS mailed_callsign ON mailed (callsign)")
+    con.execute("CREATE INDEX IF NOT EXISTS mailed_serial ON mailed (serial)")
+    con.commit()
+    return con
+
+def read_manifest(path):
+    """read_manifest(path):
+
+    Read every record in a manifest. A gzipped manifest that was cut off by a crash is read up
+    to its last complete record.
+
+    Returns: a generator of records.
+
+    """
+    with _open(path, 'rb') as manifest:
+        try:
+            for line in manifest:
+                if line.endswith(b'\n'):
+                    yield json.loads(line)
+        except EOFError:
+            return
+
+
+class ManifestWriter:
+    """ManifestWriter(path, output, index_path=DEFAULT_INDEX_PATH):
+
+    Append labels that went to output (one of OUTPUTS) to a new manifest at path (or next to
+    it, if path is taken; see _create()) as they're done, and file them in the index.
+
+    """
+
+    def __init__(self, path, output, index_path=DEFAULT_INDEX_PATH):
+        if output not in OUTPUTS:
+            raise ValueError(f"Unknown manifest output {output}.")
+        self.path, self.manifest = _create(os.path.abspath(path))
+        self.output = output
+        self.count = 0
+        self.con = _connect(index_path)
+
+    def write(self, qsos):
+        """write(qsos):
+
+        Append a list of finished labels (QSOs or grouped cards) to the manifest and flush it,
+        then index them, in one transaction.
+
+        Returns: nothing.
+
+        """
+        with timings.timed('manifest'):
+            rows = []
+            for q_p in qsos:
+                offset = self.manifest.tell()
+                self.manifest.write(json.dumps(dict(q_p, output=self.output)).encode('ascii') +
+                    b'\n')
+                for callsign in q_p.get('callsigns', [q_p['callsign']]):
+                    rows.append(((callsign or '').upper(), q_p.get('serial'), self.path, offset,
+                        self.output))
+            self.manifest.flush()
+            self.count += len(qsos)
+            self.con.executemany("INSERT INTO mailed (callsign, serial, manifest, offset, " +
+                "output) VALUES (?, ?, ?, ?, ?)", rows)
+            self.con.commit()
+
+    def close(self):
+        """close():
+
+        Close the manifest and the index, and say where the manifest is.
+
+        Returns: nothing.
+
+        """
+        self.manifest.close()
+        self.con.close()
+        print(f"Wrote {self.count} labels ({self.output}) to {self.path}")
+
+
+class ManifestIndex:
+    """ManifestIndex(index_path=DEFAULT_INDEX_PATH):
+
+    Look labels up, across every manifest in the index, by callsign or serial.
+
+    """
+
+    def __init__(self, index_path=DEFAULT_INDEX_PATH):
+        self.con = _connect(index_path)
+
+    def find(self, callsign=None, serial=None, mailed=True):
+        """find(callsign=None, serial=None, mailed=True):
+
+        Find the labels for callsign, or with serial: if mailed is set, only those that were
+        mailed (went to one of MAILED_OUTPUTS), counting labels from before outputs were
+        recorded. A manifest that's been moved or deleted since is skipped.
+
+        Returns: a list of (manifest path, record) tuples, oldest first.
+
+        """
+        if callsign is not None:
+            where, params = "callsign = ?", [callsign.upper()]
+        else:
+            where, params = "serial = ?", [serial]
+        if mailed:
+            where += f" AND (output IS NULL OR output IN ({', '.join('?' * len(MAILED_OUTPUTS))}))"
+            params += MAILED_OUTPUTS
+        rows = self.con.execute(f"SELECT manifest, offset FROM mailed WHERE {where} " +
+            "ORDER BY rowid", params).fetchall()
+        found = []
+        for path, offset in rows:
+            if not os.path.exists(path):
+                continue
+            with _open(path, 'rb') as manifest:
+                manifest.seek(offset)
+                found.append((path, json.loads(manifest.readline())))
+        return found
+
+    def close(self):
+        """close():
+
+        Close the underlying SQLite connection.
+
+        Returns: nothing.
+
+        """
+        self.con.close()
+
+
+def run_tests():
+    """run_tests():
+
+    Write a manifest from a printer run and a gzipped one from an images run, and check that
+    labels are found by callsign (including a grouped card's other callsigns) and serial, that
+    only the printer run's count as mailed, that a gzipped manifest cut off partway is read up
+    to its last whole record, that a second run given the same manifest name writes alongside
+    the first rather than over it, and that a manifest that's been moved is skipped.
+
+    Returns: nothing; raises AssertionError if a check fails.
+
+    """
+    printed = [{'callsign': 'K1AB', 'date': '2022-10-10', 'serial': '000001'},
+        {'callsign': 'W7WIL', 'date': '2022-10-11', 'serial': '000002',
+            'callsigns': ['W7WIL', 'k7wil'], 'qsos': [{}, {}]},
+        {'callsign': 'N0CALL', 'date': '2022-10-12', 'serial': None}]
+    previews = [{'callsign': 'K1AB', 'date': '2022-10-13', 'serial': '000003'}]
+    with tempfile.TemporaryDirectory() as directory, \
+        contextlib.redirect_stdout(io.StringIO()):
+        index_path = os.path.join(directory, 'index.db')
+        paths = [os.path.join(directory, name) for name in ('printed.jsonl', 'images.jsonl.gz')]
+        for path, output, labels in zip(paths, ('printer', 'images'), (printed, previews)):
+            writer = ManifestWriter(path, output, index_path)
+            for label in labels:
+                writer.write([label])
+            writer.close()
+
+        writer = ManifestWriter(paths[0], 'printer', index_path)
+        writer.write([{'callsign': 'W1AW', 'date': '2022-10-14', 'serial': '000004'}])
+        writer.close()
+        assert writer.path == os.path.join(directory, 'printed-2.jsonl'), writer.path
+
+        manifests = ManifestIndex(index_path)
+        assert manifests.find(callsign='W1AW') == [(writer.path, {'callsign': 'W1AW',
+            'date': '2022-10-14', 'serial': '000004', 'output': 'printer'})]
+        found = manifests.find(callsign='k1ab')
+        assert found == [(paths[0], dict(printed[0], output='printer'))], found
+        found = manifests.find(callsign='K1AB', mailed=False)
+        assert [label['serial'] for _, label in found] == ['000001', '000003'], found
+        assert [label['serial'] for _, label in manifests.find(callsign='K7WIL')] == ['000002']
+        assert [path for path, _ in manifests.find(serial='000003', mailed=False)] == paths[1:]
+        assert manifests.find(serial='000003') == []
+        assert manifests.find(callsign='N0CALL')[0][1]['serial'] is None
+
+        assert list(read_manifest(paths[0])) == [dict(label, output='printer')
+            for label in printed]
+        with open(paths[1], 'r+b') as manifest:
+            manifest.truncate(os.path.getsize(paths[1]) - 4)
+        assert list(read_manifest(paths[1])) == [dict(previews[0], output='images')]
+        os.replace(paths[0], paths[0] + '.moved')
+        assert manifests.find(callsign='K1AB') == []
+        manifests.close()
+    print("mailing_manifest: all tests passed")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,158 @@
+"""
+Runs the stages of a mailing (reading the log, looking up addresses, barcoding, rendering) in
+threads of their own, joined by bounded queues, so that each stage works on the next QSO while
+the stages after it are still busy: the printer prints card 1 while card 2 is rendered and card
+3 is looked up. Queues are bounded, so a slow printer holds the earlier stages back rather than
+letting them fill memory.
+
+Each stage is an ordinary generator, as it is without threads, and keeps note of how much it
+moved, how deep its queue got, and who was kept waiting, for report().
+
+"""
+
+
+import queue
+import threading
+import time
+
+# How many items can wait between two stages, unless a stage says otherwise.
+DEFAULT_DEPTH = 1000
+
+# Put on a queue after a stage's last item.
+_DONE = object()
+
+
+class Stage:
+    """Stage(name, items, depth=DEFAULT_DEPTH):
+
+    Iterate over items (usually a generator) in a thread of its own, starting straight away,
+    handing them on through a queue of up to depth items. Iterating over the Stage gets them
+    back, in order, in the consuming thread; an exception in the stage is raised there too.
+
+    """
+
+    def __init__(self, name, items, depth=DEFAULT_DEPTH):
+        self.name = name
+        self.queue = queue.Queue(depth)
+        self.error = None
+        self.stopped = False
+        self.count = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        # Time the stage spent waiting for room in the queue: whatever's downstream is slower.
+        self.full_time = 0.0
+        # Time the consumer spent waiting for the stage: this stage (or one before it) is slower.
+        self.empty_time = 0.0
+        self.max_depth = 0
+        self.total_depth = 0
+        self.thread = threading.Thread(target=self._run, args=(items,), name=f"pipeline-{name}",
+            daemon=True)
+        self.thread.start()
+
+    def _run(self, items):
+        """Move items onto the queue until they run out, or the stage is stopped."""
+        try:
+            for item in items:
+                if self.stopped:
+                    break
+                depth = self.queue.qsize()
+                self.max_depth = max(self.max_depth, depth)
+                self.total_depth += depth
+                started = time.perf_counter()
+                self.queue.put(item)
+                self.full_time += time.perf_counter() - started
+                self.count += 1
+        except BaseException as error: # SystemExit too, so that sys.exit() in a stage stops the run
+            self.error = error
+        finally:
+            if hasattr(items, 'close'):
+                items.close()
+            self.finished = time.perf_counter()
+            if not self.stopped:
+                self.queue.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            started = time.perf_counter()
+            item = self.queue.get()
+            self.empty_time += time.perf_counter() - started
+            if item is _DONE:
+                self.thread.join()
+                if self.error is not None:
+                    raise self.error
+                return
+            yield item
+
+    def stop(self):
+        """stop():
+
+        Stop the stage early, e.g. because the run has failed further down, and wait for its
+        thread to finish.
+
+        Returns: nothing.
+
+        """
+        self.stopped = True
+        while self.thread.is_alive():
+            try:
+                self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+class Pipeline:
+    """Pipeline(depth=DEFAULT_DEPTH):
+
+    The stages of one run, in order. stage() adds one, close() stops any that are still going,
+    and report() prints what each of them did.
+
+    """
+
+    def __init__(self, depth=DEFAULT_DEPTH):
+        self.depth = depth
+        self.stages = []
+        self.started = time.perf_counter()
+
+    def stage(self, name, items, depth=None):
+        """stage(name, items, depth=None):
+
+        Start running items in a thread of its own, as the next stage.
+
+        Returns: the Stage, to iterate over in the next stage (or the final consumer).
+
+        """
+        stage = Stage(name, items, depth or self.depth)
+        self.stages.append(stage)
+        return stage
+
+    def close(self):
+        """close():
+
+        Stop every stage that's still running, last first, so nothing is left blocked on a
+        queue that nobody's reading.
+
+        Returns: nothing.
+
+        """
+        for stage in reversed(self.stages):
+            stage.stop()
+
+    def report(self):
+        """report():
+
+        Print, for each stage: how many items it handed on, how fast, the most and average
+        items waiting in its queue, how long it was held up by a full queue (so the stages after
+        it were slower), and how long its consumer waited on an empty one (so it was slower).
+
+        Returns: nothing.
+
+        """
+        elapsed = time.perf_counter() - self.started
+        print(f"Pipeline ({elapsed:.2f}s):")
+        print(f"  {'stage':10} {'items':>8} {'items/sec':>10} {'max queue':>10} " +
+            f"{'avg queue':>10} {'held up':>9} {'waited on':>10}")
+        for stage in self.stages:
+            running = (stage.finished or time.perf_counter()) - stage.started
+            print(f"  {stage.name:10} {stage.count:8d} {stage.count / max(running, 1e-9):10.1f} " +
+                f"{stage.max_depth:10d} {stage.total_depth / max(stage.count, 1):10.1f} " +
+                f"{stage.full_time:8.2f}s {stage.empty_time:9.2f}s")
@@ -0,0 +1,270 @@
+"""
+Prints rendered cards on a Brother QL label printer in-process, through the brother_ql library
+(https://brother-ql.net/), instead of shelling out to brother_ql_create and brother_ql_print for
+every label.
+
+One connection to the printer is kept open for the whole batch, and several labels can go to
+the printer as a single job. Passing output_file instead of a printer sends the raster data to a
+file, which is handy for testing without hardware.
+
+"""
+
+
+import time
+
+import PIL.ImageOps
+from PIL import Image # Pillow comes along with brother_ql
+from brother_ql.backends import backend_factory, guess_backend
+from brother_ql.devicedependent import ENDLESS_LABEL, label_type_specs, right_margin_addition
+from brother_ql.exceptions import BrotherQLUnsupportedCmd
+from brother_ql.raster import BrotherQLRaster
+from brother_ql.reader import interpret_response
+
+import timings
+
+# How long to wait for the printer to say it's finished a label, in seconds.
+PRINT_TIMEOUT = 10
+# brother_ql_create's default threshold of 70% black, on the 0-255 scale convert() uses.
+THRESHOLD = int((100 - 70) / 100 * 255)
+
+
+class PrinterError(Exception):
+    """The printer reported an error, or didn't confirm a print job in time."""
+
+
+def read_pbm(data):
+    """read_pbm(data):
+
+    Split a binary (P4) PBM image into its size and its pixels.
+
+    Returns: a tuple of ((width, height), rows of packed bits, most significant bit first and
+    1 for black).
+
+    """
+    fields = []
+    pos = 0
+    while len(fields) < 3:
+        if data[pos:pos + 1].isspace():
+            pos += 1
+        elif data[pos:pos + 1] == b'#':
+            pos = data.index(b'\n', pos) + 1
+        else:
+            end = pos
+            while not data[end:end + 1].isspace():
+                end += 1
+            fields.append(data[pos:end])
+            pos = end
+    if fields[0] != b'P4':
+        raise ValueError("Not a binary PBM image.")
+    # A single whitespace character separates the header from the pixels.
+    return (int(fields[1]), int(fields[2])), data[pos + 1:]
+
+
+class FileBackend:
+    """FileBackend(path):
+
+    A stand-in for a brother_ql backend that appends the raster data to a file instead of
+    sending it to a printer.
+
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'ab')
+
+    def write(self, data):
+        """Append raster data to the file."""
+        self.file.write(data)
+        self.file.flush()
+
+    def read(self, length=32):
+        """There's no printer to read status back from."""
+        return b''
+
+    def dispose(self):
+        """Close the file."""
+        self.file.close()
+
+
+class QLPrinter:
+    """QLPrinter(printer_identifier=None, model='QL-800', label='62', output_file=None):
+
+    An open connection to a Brother QL printer (or to output_file), loaded with a continuous
+    roll. Cards are queued with queue_card() and sent as a single job by flush(). Images are
+    prepared with the brother_ql_create defaults this program has always used: no dithering,
+    threshold 70%.
+
+    """
+
+    def __init__(self, printer_identifier=None, model='QL-800', label='62', output_file=None):
+        self.model = model
+        self.label_specs = label_type_specs[label]
+        if self.label_specs['kind'] != ENDLESS_LABEL:
+            raise ValueError(f"Label size {label} isn't a continuous roll.")
+        self.pixel_width = BrotherQLRaster(model).get_pixel_width()
+        self.right_margin = (self.label_specs['right_margin_dots'] +
+            right_margin_addition.get(model, 0))
+        self.queued = []
+        if output_file:
+            self.backend_name = 'file'
+            self.device = FileBackend(output_file)
+        else:
+            self.backend_name = guess_backend(printer_identifier)
+            backend_class = backend_factory(self.backend_name)['backend_class']
+            self.device = backend_class(printer_identifier)
+
+    def queue_card(self, data, size, bilevel=False):
+        """queue_card(data, size, bilevel=False):
+
+        Add one card, given as 8-bit grayscale pixels of the given (width, height), to the next
+        print job. It's converted to the printer's 1-bit format straight away, so a queue of
+        cards doesn't hold onto the full grayscale images.
+
+        If bilevel is set, the card is already 1-bit, as packed rows with 1 for black, the way
+        read_pbm() gives them. That's what the printer wants already, so there's nothing to
+        convert.
+
+        Returns: nothing.
+
+        """
+        if bilevel:
+            # PIL's 1-bit images are 1 for white, so black pixels come in as 1s: dots to print.
+            image = Image.frombytes('1', size, data)
+            blank = 0
+        else:
+            image = Image.frombytes('L', size, data)
+            blank = 255
+        if image.size[0] < self.pixel_width:
+            # Continuous labels are printed against the right-hand margin of the print head.
+            padded = Image.new(image.mode, (self.pixel_width, image.size[1]), blank)
+            padded.paste(image, (self.pixel_width - image.size[0] - self.right_margin, 0))
+            image = padded
+        if not bilevel:
+            image = PIL.ImageOps.invert(image)
+            image = image.point(lambda x: 0 if x < THRESHOLD else 255, mode='1')
+        self.queued.append(image)
+
+    def raster(self, images, cut_every=1):
+        """raster(images, cut_every=1):
+
+        Build a single QL raster job with one page per prepared image, the way
+        brother_ql.conversion.convert() does, except that the printer cuts after every
+        cut_every labels (0 means only at the end of the job) and only the last page ends the
+        job.
+
+        Returns: the raster instructions, as bytes.
+
+        """
+        pages = []
+        qlr = BrotherQLRaster(self.model)
+        qlr.exception_on_warning = True
+        try:
+            qlr.add_switch_mode()
+        except BrotherQLUnsupportedCmd:
+            pass
+        qlr.add_invalidate()
+        qlr.add_initialize()
+        try:
+            qlr.add_switch_mode()
+        except BrotherQLUnsupportedCmd:
+            pass
+
+        for page, image in enumerate(images):
+            qlr.add_status_information()
+            qlr.mtype = 0x0A
+            qlr.mwidth = self.label_specs['tape_size'][0]
+            qlr.mlength = 0
+            qlr.pquality = 1
+            qlr.page_number = page
+            qlr.add_media_and_quality(image.size[1])
+            try:
+                qlr.add_autocut(cut_every > 0)
+                qlr.add_cut_every(cut_every or 1)
+            except BrotherQLUnsupportedCmd:
+                pass
+            try:
+                qlr.dpi_600 = False
+                qlr.cut_at_end = True
+                qlr.two_color_printing = False
+                qlr.add_expanded_mode()
+            except BrotherQLUnsupportedCmd:
+                pass
+            qlr.add_margins(self.label_specs['feed_margin'])
+            qlr.add_raster_data(image)
+            qlr.add_print(last_page=(page == len(images) - 1))
+            # BrotherQLRaster grows qlr.data with +=, which gets quadratic over a long job.
+            pages.append(qlr.data)
+            qlr.data = b''
+        return b''.join(pages)
+
+    def flush(self, cut_every=1):
+        """flush(cut_every=1):
+
+        Send every queued card to the printer as one job, wait for it to finish, and report
+        how long that took. If the job didn't print, wait()'s PrinterError is passed on, and the
+        cards stay queued.
+
+        Returns: nothing.
+
+        """
+        if not self.queued:
+            return
+        started = time.perf_counter()
+        with timings.timed('raster'):
+            instructions = self.raster(self.queued, cut_every)
+        with timings.timed('send'):
+            self.device.write(instructions)
+        with timings.timed('printer_wait'):
+            self.wait(len(self.queued))
+        elapsed = time.perf_counter() - started
+        timings.count('labels_printed', len(self.queued))
+        timings.count('bytes_sent', len(instructions))
+        print(f"Printed a batch of {len(self.queued)} labels in {elapsed:.2f}s " +
+            f"({len(self.queued) / max(elapsed, 1e-9):.1f} labels/sec)")
+        self.queued = []
+
+    def wait(self, pages=1):
+        """wait(pages=1):
+
+        Block until the printer reports that it has printed pages labels and is ready for
+        more, the way brother_ql_print does. Backends that can't report status return straight
+        away. Raises PrinterError if the printer reports an error (a jam, or running out of
+        labels), or hasn't confirmed the labels after PRINT_TIMEOUT per label.
+
+        Returns: nothing.
+
+        """
+        if self.backend_name in ('file', 'network'):
+            return
+        started = time.time()
+        printed = 0
+        ready = False
+        while time.time() - started < PRINT_TIMEOUT * pages and not (printed >= pages and ready):
+            data = self.device.read()
+            if not data:
+                time.sleep(0.005)
+                continue
+            try:
+                result = interpret_response(data)
+            except (NameError, ValueError):
+                # brother_ql raises NameError for a short or garbled response.
+                continue
+            if result['errors']:
+                raise PrinterError(f"The printer reported errors: {', '.join(result['errors'])}.")
+            if result['status_type'] == 'Printing completed':
+                printed += 1
+            if (result['status_type'] == 'Phase change' and
+                result['phase_type'] == 'Waiting to receive'):
+                ready = True
+        if not (printed >= pages and ready):
+            raise PrinterError(f"The printer didn't confirm that {pages} labels printed " +
+                f"within {PRINT_TIMEOUT * pages}s.")
+
+    def close(self):
+        """close():
+
+        Release the printer (or close the output file).
+
+        Returns: nothing.
+
+        """
+        self.device.dispose()
@@ -14,3 +14,8 @@ SERVICE_ID = "270"
 # For the label printer (I use a Brother QL-800)
 # Should be "usb://<vendorid>:<productid>", like "usb://0x04f9:0x209b"
 PRINTER_IDENTIFIER = "usb://0x04f9:0x209b"
+
+# Model and label size, as brother_ql names them (see "brother_ql info models" and
+# "brother_ql info labels"). 62 is the 62mm (2.4") continuous roll.
+PRINTER_MODEL = "QL-800"
+LABEL_SIZE = "62"
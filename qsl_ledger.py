@@ -0,0 +1,139 @@
+"""
+A ledger of every QSO a card has been printed for, so that a cumulative ADIF export (everything
+the logger has ever seen) can be run again and again, and only the new contacts get cards.
+
+QSOs are keyed on callsign, date, time on, band (or the frequency, if the log doesn't give the
+band) and mode; the key is the table's primary key, so checking a QSO is one index probe.
+
+"""
+
+
+import contextlib
+from datetime import date
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+
+import timings
+
+DEFAULT_LEDGER_PATH = 'qsl_ledger.db'
+
+
+def ledger_key(q_p):
+    """ledger_key(q_p):
+
+    Returns: the (callsign, date, time, band or frequency, mode) a QSO is filed under.
+
+    """
+    return (q_p['callsign'] or '', q_p['date'], q_p['time'],
+        q_p.get('band') or q_p['frequency'] or '', (q_p['mode'] or '').upper())
+
+
+class SentLedger:
+    """SentLedger(path=DEFAULT_LEDGER_PATH):
+
+    The QSOs that cards have been sent for. unsent() filters a stream of QSOs against it, and
+    record() adds cards to it once they've been printed.
+
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        # With --pipeline, QSOs are checked from the reading stage's thread and recorded from the
+        # printing one, so the connection is shared, one method at a time.
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.con.execute("CREATE TABLE IF NOT EXISTS sent " +
+            "(callsign text, qso_date text, time_on text, band text, mode text, sent_on text, " +
+            "serial text, PRIMARY KEY (callsign, qso_date, time_on, band, mode)) WITHOUT ROWID")
+        self.con.commit()
+
+    def unsent(self, qsos):
+        """unsent(qsos):
+
+        Drop the QSOs that cards have already been sent for.
+
+        Returns: a generator of the rest, in the order they came in.
+
+        """
+        skipped = 0
+        for q_p in qsos:
+            with self.lock:
+                sent = self.con.execute("SELECT 1 FROM sent WHERE callsign = ? AND qso_date = ? " +
+                    "AND time_on = ? AND band = ? AND mode = ?", ledger_key(q_p)).fetchone()
+            if sent:
+                skipped += 1
+                continue
+            yield q_p
+        print(f"Skipped {skipped} QSOs that cards were already sent for")
+
+    def record(self, cards):
+        """record(cards):
+
+        Add a list of printed cards to the ledger: each QSO on them, along with the card's
+        serial, if it had one.
+
+        Returns: nothing.
+
+        """
+        today = date.today().isoformat()
+        with self.lock, timings.timed('ledger'):
+            self.con.executemany("INSERT OR REPLACE INTO sent " +
+                "(callsign, qso_date, time_on, band, mode, sent_on, serial) " +
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [ledger_key(q_p) + (today, card.get('serial'))
+                    for card in cards for q_p in card.get('qsos', [card])])
+            self.con.commit()
+
+    def close(self):
+        """close():
+
+        Close the underlying SQLite connection.
+
+        Returns: nothing.
+
+        """
+        self.con.close()
+
+
+def run_tests():
+    """run_tests():
+
+    Record a single-QSO card and a grouped one, and check that unsent() drops exactly their
+    QSOs from a later run, keyed on band where the log gives it and frequency where it doesn't,
+    with the mode in any case, and that they stay recorded once the ledger's reopened.
+
+    Returns: nothing; raises AssertionError if a check fails.
+
+    """
+    def qso(callsign, time, band=None, mode='FT8'):
+        return {'callsign': callsign, 'date': '2022-10-10', 'time': time, 'band': band,
+            'frequency': '14.074', 'mode': mode}
+
+    single = dict(qso('K1AB', '12:00:00Z', band='20m'), serial='000001')
+    grouped = dict(qso('W7WIL', '13:00:00Z'), serial='000002',
+        qsos=[qso('W7WIL', '13:00:00Z'), qso('W7WIL', '14:00:00Z')])
+    with tempfile.TemporaryDirectory() as directory, \
+        contextlib.redirect_stdout(io.StringIO()):
+        path = os.path.join(directory, 'ledger.db')
+        ledger = SentLedger(path)
+        ledger.record([single, grouped])
+        ledger.close()
+
+        ledger = SentLedger(path)
+        later = [qso('K1AB', '12:00:00Z', band='20m', mode='ft8'),
+            qso('K1AB', '12:00:00Z', band='40m'), qso('W7WIL', '13:00:00Z'),
+            qso('W7WIL', '14:00:00Z'), qso('W7WIL', '15:00:00Z'), qso('N0CALL', '12:00:00Z')]
+        unsent = [(q_p['callsign'], q_p['time'], q_p['band']) for q_p in ledger.unsent(later)]
+        assert unsent == [('K1AB', '12:00:00Z', '40m'), ('W7WIL', '15:00:00Z', None),
+            ('N0CALL', '12:00:00Z', None)], unsent
+        serials = dict(ledger.con.execute("SELECT time_on, serial FROM sent").fetchall())
+        assert serials == {'12:00:00Z': '000001', '13:00:00Z': '000002',
+            '14:00:00Z': '000002'}, serials
+        ledger.close()
+    print("qsl_ledger: all tests passed")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,146 @@
+"""
+Hands out Intelligent Mail barcode serial numbers that are unique per Mailer ID, and remembers
+which callsign and QSO each one went to.
+
+USPS wants a serial to stay unique for 45 days. Serials are issued in sequence from a small
+SQLite store, so there are no collisions until the sequence wraps all the way around; after
+that, a serial is only reused if it was last issued more than SERIAL_WINDOW_DAYS ago.
+
+"""
+
+
+from datetime import date, timedelta
+import sqlite3
+
+DEFAULT_SERIALS_PATH = 'serials.db'
+SERIAL_WINDOW_DAYS = 45
+
+
+class SerialsExhausted(RuntimeError):
+    """Every serial number available to a Mailer ID has been used in the last 45 days."""
+
+
+def serial_digits(mailer_id):
+    """serial_digits(mailer_id):
+
+    Nine-digit Mailer IDs (the ones starting with 9) get a 6-digit serial in the barcode, and
+    six-digit Mailer IDs get 9 digits. This matches how imb.encode() lays out the tracking code.
+
+    Returns: the number of digits in a serial for mailer_id.
+
+    """
+    return 6 if str(int(mailer_id))[0] == '9' else 9
+
+
+class SerialAllocator:
+    """SerialAllocator(mailer_id, path=DEFAULT_SERIALS_PATH):
+
+    A persistent sequence of serial numbers for one Mailer ID. reserve() hands out a block at a
+    time, so that several workers can allocate without stepping on each other, and record()
+    notes what each serial was used for.
+
+    """
+
+    def __init__(self, mailer_id, path=DEFAULT_SERIALS_PATH):
+        self.mailer_id = str(mailer_id)
+        self.digits = serial_digits(mailer_id)
+        self.capacity = 10 ** self.digits
+        # Autocommit, so that reserve() can take the write lock with BEGIN IMMEDIATE itself. With
+        # --pipeline, the barcode stage uses it from its own thread.
+        self.con = sqlite3.connect(path, isolation_level=None, timeout=30,
+            check_same_thread=False)
+        self.con.execute("CREATE TABLE IF NOT EXISTS sequences " +
+            "(mailer_id text PRIMARY KEY, next_serial integer, wraps integer)")
+        self.con.execute("CREATE TABLE IF NOT EXISTS issued " +
+            "(mailer_id text, serial integer, issued_on text, callsign text, qso_date text, " +
+            "qso_time text, PRIMARY KEY (mailer_id, serial)) WITHOUT ROWID")
+        self.con.execute("INSERT OR IGNORE INTO sequences (mailer_id, next_serial, wraps) " +
+            "VALUES (?, 0, 0)", (self.mailer_id,))
+
+    def reserve(self, count):
+        """reserve(count):
+
+        Take the next count serials in the sequence for this Mailer ID. Until the sequence has
+        wrapped around, that's all it takes; after that, each serial is checked (by primary
+        key) against the 45-day window.
+
+        Returns: a list of count serial numbers, as ints.
+
+        """
+        if count == 0:
+            return []
+        self.con.execute("BEGIN IMMEDIATE")
+        try:
+            next_serial, wraps = self.con.execute("SELECT next_serial, wraps FROM sequences " +
+                "WHERE mailer_id = ?", (self.mailer_id,)).fetchone()
+            serials = [(next_serial + i) % self.capacity for i in range(count)]
+            if next_serial + count > self.capacity:
+                wraps += 1
+            if wraps:
+                cutoff = (date.today() - timedelta(days=SERIAL_WINDOW_DAYS)).isoformat()
+                for serial in serials:
+                    row = self.con.execute("SELECT issued_on FROM issued " +
+                        "WHERE mailer_id = ? AND serial = ?", (self.mailer_id, serial)).fetchone()
+                    if row and row[0] > cutoff:
+                        raise SerialsExhausted(f"Serial {serial} for Mailer ID {self.mailer_id} " +
+                            f"was issued on {row[0]}, within the last {SERIAL_WINDOW_DAYS} days.")
+            self.con.execute("UPDATE sequences SET next_serial = ?, wraps = ? " +
+                "WHERE mailer_id = ?", ((next_serial + count) % self.capacity, wraps,
+                self.mailer_id))
+            self.con.execute("COMMIT")
+        except BaseException:
+            self.con.execute("ROLLBACK")
+            raise
+        return serials
+
+    def record(self, issues):
+        """record(issues):
+
+        Note what a batch of serials were used for. issues is a list of (serial, callsign,
+        qso_date, qso_time) tuples.
+
+        Returns: nothing.
+
+        """
+        today = date.today().isoformat()
+        self.con.execute("BEGIN")
+        self.con.executemany("INSERT OR REPLACE INTO issued " +
+            "(mailer_id, serial, issued_on, callsign, qso_date, qso_time) " +
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.mailer_id, serial, today, callsign, qso_date, qso_time)
+                for serial, callsign, qso_date, qso_time in issues])
+        self.con.execute("COMMIT")
+
+    def lookup(self, serial):
+        """lookup(serial):
+
+        Find out what a serial was issued for, e.g. when USPS tracking turns one up.
+
+        Returns: a dict with serial, issued_on, callsign, qso_date and qso_time, or None if the
+        serial hasn't been issued.
+
+        """
+        row = self.con.execute("SELECT serial, issued_on, callsign, qso_date, qso_time " +
+            "FROM issued WHERE mailer_id = ? AND serial = ?",
+            (self.mailer_id, int(serial))).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('serial', 'issued_on', 'callsign', 'qso_date', 'qso_time'), row))
+
+    def format(self, serial):
+        """format(serial):
+
+        Returns: serial as a zero-padded string of the right width for this Mailer ID.
+
+        """
+        return f"{serial:0{self.digits}d}"
+
+    def close(self):
+        """close():
+
+        Close the underlying SQLite connection.
+
+        Returns: nothing.
+
+        """
+        self.con.close()
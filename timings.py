@@ -0,0 +1,225 @@
+"""
+Timers and counters for --timings, --trace and --profile, to find out where a slow run's time
+goes: reading the log, address lookups, barcodes, rendering, rastering or the printer itself.
+
+The stages are always instrumented, with timed(), timed_items() and count(), but until
+enable() is called those cost next to nothing: timed_items() hands its items straight back.
+
+A span's total time includes any spans inside it (a stage's generator pulling on the stage
+before it, say); its own time doesn't, so the own times add up to the run. Spans are kept per
+thread, so they work with --pipeline, where each stage's own time also includes waiting on the
+stage before it (pipeline.Pipeline's report tells the two apart).
+
+"""
+
+
+import cProfile
+from contextlib import nullcontext
+import json
+import os
+import pstats
+import threading
+import time
+
+# The Timings for this run, once enable() has been called.
+_TIMINGS = None
+
+
+class Timings:
+    """Timings(trace=False):
+
+    Accumulated spans (calls, total and own time, by name) and counters for one run, and, if
+    trace is set, every span on its own, for write_trace().
+
+    """
+
+    def __init__(self, trace=False):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.counters = {}
+        self.events = [] if trace else None
+        self.threads = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def begin(self):
+        """begin():
+
+        Start a span in this thread.
+
+        Returns: its start time, to pass to end().
+
+        """
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        # Time spent in spans nested inside this one.
+        self.local.stack.append(0.0)
+        return time.perf_counter()
+
+    def end(self, name, started, calls=1):
+        """end(name, started, calls=1):
+
+        Finish this thread's innermost span, started at started, and add it to name.
+
+        Returns: nothing.
+
+        """
+        elapsed = time.perf_counter() - started
+        stack = self.local.stack
+        own = elapsed - stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with self.lock:
+            span = self.spans.setdefault(name, [0, 0.0, 0.0])
+            span[0] += calls
+            span[1] += elapsed
+            span[2] += own
+            if self.events is not None:
+                thread = threading.current_thread()
+                self.threads[thread.ident] = thread.name
+                self.events.append((name, started, elapsed, thread.ident))
+
+    def report(self):
+        """report():
+
+        Print each span's calls, total and own time, most own time first, then the counters.
+
+        Returns: nothing.
+
+        """
+        elapsed = time.perf_counter() - self.started
+        print(f"Timings ({elapsed:.2f}s):")
+        print(f"  {'span':14} {'calls':>8} {'total':>9} {'own':>9} {'own/call':>10} {'share':>6}")
+        for name, (calls, total, own) in sorted(self.spans.items(), key=lambda span: -span[1][2]):
+            print(f"  {name:14} {calls:8d} {total:8.3f}s {own:8.3f}s " +
+                f"{own * 1000 / max(calls, 1):8.3f}ms {own / max(elapsed, 1e-9):6.1%}")
+        if self.counters:
+            print("  " + ", ".join(f"{name}: {value}" for name, value in self.counters.items()))
+
+    def write_trace(self, path):
+        """write_trace(path):
+
+        Write every span as a Chrome trace (the JSON Trace Event Format), for chrome://tracing
+        or https://ui.perfetto.dev/, with a track per thread.
+
+        Returns: nothing.
+
+        """
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': ident,
+            'args': {'name': name}} for ident, name in self.threads.items()]
+        events += [{'name': name, 'ph': 'X', 'pid': pid, 'tid': ident,
+            'ts': round((started - self.started) * 1e6, 1), 'dur': round(elapsed * 1e6, 1)}
+            for name, started, elapsed, ident in self.events]
+        with open(path, 'w', encoding='utf-8') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': self.counters}, trace_file)
+        print(f"Wrote {len(self.events)} spans to {path}")
+
+
+class _Span:
+    """A context manager for one span of a Timings."""
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = self.timings.begin()
+
+    def __exit__(self, *exc_info):
+        self.timings.end(self.name, self.started)
+
+
+def enable(trace=False):
+    """enable(trace=False):
+
+    Start timing this run; if trace is set, keep every span for write_trace() too.
+
+    Returns: the Timings.
+
+    """
+    global _TIMINGS
+    _TIMINGS = Timings(trace)
+    return _TIMINGS
+
+def timed(name):
+    """timed(name):
+
+    Returns: a context manager that times what's inside it as a span of name.
+
+    """
+    if _TIMINGS is None:
+        return nullcontext()
+    return _Span(_TIMINGS, name)
+
+def timed_items(name, items):
+    """timed_items(name, items):
+
+    Time a stage's iterable (usually a generator) as a span of name, one call per item.
+
+    Returns: an iterator of the same items.
+
+    """
+    if _TIMINGS is None:
+        return items
+    return _timed_items(_TIMINGS, name, items)
+
+def _timed_items(timings, name, items):
+    """The generator behind timed_items()."""
+    iterator = iter(items)
+    try:
+        while True:
+            started = timings.begin()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                # Finishing up (a generator's last report, say) counts, but isn't an item.
+                timings.end(name, started, calls=0)
+                return
+            except BaseException:
+                timings.end(name, started)
+                raise
+            timings.end(name, started)
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
+
+def count(name, amount=1):
+    """count(name, amount=1):
+
+    Add amount to the counter name.
+
+    Returns: nothing.
+
+    """
+    if _TIMINGS is not None:
+        with _TIMINGS.lock:
+            _TIMINGS.counters[name] = _TIMINGS.counters.get(name, 0) + amount
+
+def start_profile():
+    """start_profile():
+
+    Start profiling this thread with cProfile.
+
+    Returns: the cProfile.Profile, for finish_profile().
+
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def finish_profile(profiler, path, top=25):
+    """finish_profile(profiler, path, top=25):
+
+    Stop profiler, save its stats to path (for pstats, snakeviz and the like), and print the
+    top functions by cumulative time.
+
+    Returns: nothing.
+
+    """
+    profiler.disable()
+    profiler.dump_stats(path)
+    pstats.Stats(path).sort_stats('cumulative').print_stats(top)
+    print(f"Wrote profile to {path}")